@@ -0,0 +1,80 @@
+"""
+Compares the HTML parser backends of the scraper on a corpus of saved pages.
+
+Each backend runs in a fresh process so peak RSS (which, unlike
+tracemalloc, includes the C allocations of lxml and selectolax) isn't
+skewed by the others. `--scale` repeats each page's body to stand in for
+the multi-megabyte pages that dominate scrape CPU time.
+
+Usage:
+    python -m benchmarks.bench_parsers --rounds 20 --scale 10
+    python -m benchmarks.bench_parsers --corpus path/to/saved/pages
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from src.utils.html_parser import PARSERS, parse_html
+
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+
+
+def load_corpus(corpus: Path, scale: int) -> List[str]:
+    pages = []
+    for path in sorted(corpus.glob("*.html")):
+        html = path.read_text(encoding="utf-8", errors="replace")
+        head, sep, body = html.partition("<body>")
+        pages.append(head + sep + body * scale if sep else html * scale)
+    if not pages:
+        raise SystemExit(f"No .html files in {corpus}")
+    return pages
+
+
+def run_backend(backend: str, pages: List[str], rounds: int, results: Dict[str, dict]) -> None:
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    parse_html(pages[0], "https://example.com/", True, backend)  # warm up imports
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i, html in enumerate(pages):
+            # Alternate main page and subpage parsing like a real scrape
+            parse_html(html, "https://example.com/", i % 2 == 0, backend)
+    elapsed = time.perf_counter() - start
+    results[backend] = {
+        'elapsed': elapsed,
+        'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    pages = load_corpus(Path(args.corpus), args.scale)
+    total_mb = sum(len(html.encode("utf-8")) for html in pages) * args.rounds / 1e6
+    print(f"corpus: {len(pages)} pages, {total_mb / args.rounds:.2f} MB, {args.rounds} rounds")
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for backend in args.backends:
+            process = context.Process(target=run_backend, args=(backend, pages, args.rounds, results))
+            process.start()
+            process.join()
+            if backend not in results:
+                print(f"{backend:<12} failed (is it installed?)")
+                continue
+            result = results[backend]
+            print(
+                f"{backend:<12} pages/s={len(pages) * args.rounds / result['elapsed']:.1f} "
+                f"MB/s={total_mb / result['elapsed']:.1f} peak_rss_growth={result['peak_kb'] / 1024:.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=str(FIXTURES))
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--backends", nargs="+", default=list(PARSERS))
+    main(parser.parse_args())
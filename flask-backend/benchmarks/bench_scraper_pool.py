@@ -0,0 +1,94 @@
+"""
+Measures repeat and same-domain scrapes with a fresh HTTP client per
+scraper (the old behaviour) against the shared HttpClientPool.
+
+A local keep-alive server serves a main page linking to `--pages`
+subpages. `--handshake-ms` delays every new connection to stand in for the
+TCP/TLS setup cost of a remote host.
+
+Usage:
+    python -m benchmarks.bench_scraper_pool --scrapes 20 --pages 10 --handshake-ms 50
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from src.utils.http_pool import HttpClientPool
+from src.utils.scraper import WebsiteScraper
+
+
+def serve_site(pages: int, handshake_ms: float) -> tuple:
+    stats: Dict[str, int] = {'connections': 0}
+    links = "".join(f'<a href="/page{i}">Page {i}</a>' for i in range(pages))
+    body_for = {'/': f"<html><body><p>Main page</p>{links}</body></html>"}
+    for i in range(pages):
+        body_for[f'/page{i}'] = f"<html><body><p>{'Subpage text. ' * 200}</p></body></html>"
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            stats['connections'] += 1
+            time.sleep(handshake_ms / 1000)
+            super().setup()
+
+        def do_GET(self):
+            body = body_for.get(self.path, '').encode()
+            self.send_response(200 if self.path in body_for else 404)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def report(label: str, durations: List[float], connections: int) -> None:
+    print(
+        f"{label:<7} scrapes={len(durations)} mean={statistics.mean(durations) * 1000:.1f}ms "
+        f"p50={statistics.median(durations) * 1000:.1f}ms connections={connections}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    server, stats = serve_site(args.pages, args.handshake_ms)
+    url = f"http://localhost:{server.server_address[1]}/"
+
+    durations = []
+    for _ in range(args.scrapes):
+        pool = HttpClientPool(http2=False)  # what every scraper used to build for itself
+        start = time.perf_counter()
+        await WebsiteScraper(url, max_concurrent=args.pages, http_pool=pool).scrape_all()
+        durations.append(time.perf_counter() - start)
+        pool.close()
+    report("fresh", durations, stats['connections'])
+
+    stats['connections'] = 0
+    pool = HttpClientPool(http2=False)
+    durations = []
+    for _ in range(args.scrapes):
+        start = time.perf_counter()
+        await WebsiteScraper(url, max_concurrent=args.pages, http_pool=pool).scrape_all()
+        durations.append(time.perf_counter() - start)
+    report("pooled", durations, stats['connections'])
+    print(f"pooled DNS lookups: {pool.resolver.lookups}")
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scrapes", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--handshake-ms", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+Compares cold-launch screenshots (new Playwright + Chromium per request)
+against the pooled browser used by `capture_screenshot_bytes`.
+
+Usage:
+    python -m benchmarks.bench_screenshot --requests 50 --pool-size 4
+"""
+import argparse
+import asyncio
+import functools
+import statistics
+import tempfile
+import threading
+import time
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from typing import List
+
+from playwright.async_api import async_playwright
+
+from src.utils.browser_pool import BrowserPool
+
+
+PAGE = """<!doctype html>
+<html><head><title>Benchmark</title></head>
+<body>{}</body></html>
+""".format("".join(f"<section><h2>Section {i}</h2><p>{'Lorem ipsum dolor sit amet. ' * 40}</p></section>" for i in range(30)))
+
+
+def serve_static(directory: str) -> HTTPServer:
+    """Serves `directory` on a random local port in a background thread."""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+async def cold_screenshot(url: str) -> bytes:
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.goto(url)
+        image = await page.screenshot(full_page=True)
+        await browser.close()
+    return image
+
+
+async def pooled_screenshot(pool: BrowserPool, url: str) -> bytes:
+    async def job(page):
+        await page.goto(url)
+        return await page.screenshot(full_page=True)
+    return await pool.run(job)
+
+
+async def measure(label: str, shot, requests: int, concurrency: int) -> None:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await shot()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:<8} n={requests} p50={cuts[49] * 1000:.0f}ms "
+        f"p99={cuts[98] * 1000:.0f}ms throughput={requests / elapsed:.1f} req/s"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(f"{directory}/index.html", "w") as f:
+            f.write(PAGE)
+        server = serve_static(directory)
+        url = f"http://127.0.0.1:{server.server_address[1]}/index.html"
+
+        await measure("cold", lambda: cold_screenshot(url), args.requests, args.concurrency)
+
+        pool = BrowserPool(size=args.pool_size, max_uses=args.max_uses)
+        try:
+            await pooled_screenshot(pool, url)  # warm up the browser
+            await measure("pooled", lambda: pooled_screenshot(pool, url), args.requests, args.concurrency)
+        finally:
+            pool.close()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--max-uses", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""
+Load test for the /stream/<session_id> SSE endpoint.
+
+Opens `--streams` concurrent SSE connections against a running server,
+publishes timestamped events to their sessions with `publish_event` and reports
+how many streams connected and the publish-to-receive latency.
+
+Each open stream holds a worker thread, so with threaded servers the
+capacity is the thread count. Use a gevent worker to go beyond that.
+
+Usage:
+    gunicorn -k gevent --worker-connections 2000 src.app:app   # or flask --app src.app run --with-threads
+    python -m benchmarks.load_sse --streams 1000 --messages 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import List
+
+import httpx
+import redis.asyncio as async_redis
+
+from src.utils.streams import publish_event
+
+
+async def consume(client: httpx.AsyncClient, base_url: str, session_id: str, total: int,
+                  connected: asyncio.Event, latencies: List[float], ready: List[str]) -> None:
+    async with client.stream("GET", f"{base_url}/stream/{session_id}") as response:
+        response.raise_for_status()
+        ready.append(session_id)
+        if len(ready) == total:
+            connected.set()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[len("data: "):])
+            if data.get('status') == 'complete':
+                return
+            latencies.append(time.time() - data['sent_at'])
+
+
+async def main(args: argparse.Namespace) -> None:
+    redis_client = async_redis.Redis.from_url(args.redis_url)
+    session_ids = [str(uuid.uuid4()) for _ in range(args.streams)]
+    latencies: List[float] = []
+    ready: List[str] = []
+    connected = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=args.streams, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        start = time.perf_counter()
+        consumers = [
+            asyncio.create_task(consume(client, args.base_url, session_id, args.streams, connected, latencies, ready))
+            for session_id in session_ids
+        ]
+        try:
+            await asyncio.wait_for(connected.wait(), timeout=args.connect_timeout)
+        except asyncio.TimeoutError:
+            pass
+        connect_time = time.perf_counter() - start
+        print(f"connected {len(ready)}/{args.streams} streams in {connect_time:.1f}s")
+
+        # Give the server a moment to register the last subscribers
+        await asyncio.sleep(0.5)
+        for _ in range(args.messages):
+            for session_id in ready:
+                await publish_event(redis_client, session_id, {'questions': [], 'sent_at': time.time()})
+            await asyncio.sleep(args.interval)
+        for session_id in ready:
+            await publish_event(redis_client, session_id, {'status': 'complete'})
+
+        await asyncio.wait(consumers, timeout=args.connect_timeout)
+        for consumer in consumers:
+            consumer.cancel()
+
+    await redis_client.aclose()
+    expected = len(ready) * args.messages
+    print(f"received {len(latencies)}/{expected} messages")
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        print(f"latency p50={cuts[49] * 1000:.1f}ms p99={cuts[98] * 1000:.1f}ms max={max(latencies) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--connect-timeout", type=float, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -1,21 +1,24 @@
 import asyncio
 from datetime import datetime
-import os
 import json
-import time
 import uuid
 import redis
 from flask import Flask, Response, request
 
-from src.utils.utils import capture_screenshot, upload_to_s3
+from src.utils.utils import capture_screenshot_bytes, encode_image
+from src.utils.storage import get_storage
+from src.utils.streams import SessionStreams, seed_events
 from src.utils.scraper import WebsiteScraper
-from src.task import process_links_task
+from src.utils import cache, popularity, singleflight, task_payload
+from src.task import process_links_task, worker_pool_stats
 from flask_cors import CORS
 
 
 app = Flask(__name__)
 CORS(app)
 redis_client = redis.Redis(host='localhost', port=6379, db=0)
+storage = get_storage()
+session_streams = SessionStreams(redis_client)
 
 
 # Root route
@@ -39,28 +42,62 @@ async def generate_content():
         return {"error": "Invalid URL provided"}, 400
     
     session_id = str(uuid.uuid4())
+    questions, links = cache.get_many(
+        redis_client,
+        [(cache.QUESTIONS, url), (cache.LINKS, url)],
+        record=lambda pipe: popularity.record_request(pipe, url)
+    )
     
-    links_cached = redis_client.get(f"{url}:links")
-    
-    if links_cached:
-        
-        process_links_task.delay(session_id, scraper)
+    if questions and links:
+        # Fast path: everything is cached, answer without the broker, worker or DB
+        seed_events(redis_client, session_id, [
+            {'link': url, 'questions': questions},
+            {'status': 'complete'}
+        ])
         return {
             'session_id': session_id,
-            'links': json.loads(links_cached)
+            'links': links,
+            'questions': questions
         }
     
-    await scraper.scrape_all()
-    links = list(scraper.links) + [scraper.url]
-    process_links_task.delay(session_id, scraper)
+    if links:
+        # Nothing scraped here, the worker scrapes the page only if it has to generate
+        process_links_task.delay(session_id, task_payload.dump(redis_client, scraper))
+        return {
+            'session_id': session_id,
+            'links': links
+        }
     
-    if len(links) > 1: # Only cache when we see more than the original link
-        redis_client.set(f"{url}:links", json.dumps(links))
+    # Single-flight: only the first request for a URL scrapes it and queues
+    # generation, concurrent requests share its session instead.
+    lock_key = f"lock:{cache.normalize_url(url)}"
+    inflight_key = f"inflight:{cache.normalize_url(url)}"
+    leader = singleflight.acquire(redis_client, lock_key, session_id)
+    if leader is not None:
+        inflight = await singleflight.wait_for(redis_client, inflight_key, lock_key=lock_key)
+        if inflight:
+            return json.loads(inflight)
+        # Leader failed or timed out, do the work ourselves
+    else:
+        redis_client.delete(inflight_key)
+    
+    try:
+        await scraper.scrape_all()
+        links = list(scraper.links) + [scraper.url]
+        process_links_task.delay(session_id, task_payload.dump(redis_client, scraper))
         
-    return {
-        'session_id': session_id,
-        'links': links
-    }
+        if len(links) > 1: # Only cache when we see more than the original link
+            cache.LINKS.set(redis_client, url, links)
+        
+        result = {
+            'session_id': session_id,
+            'links': links
+        }
+        redis_client.set(inflight_key, json.dumps(result), ex=singleflight.LOCK_TTL)
+    finally:
+        singleflight.release(redis_client, lock_key, session_id)
+        
+    return result
 
 
 @app.route("/preview-img/")
@@ -76,55 +113,45 @@ async def get_preview_image() -> dict:
     if not valid:
         return {"error": "Invalid URL provided"}, 400
     
-    img_cached = redis_client.get(f"{url}:img")
+    img_cached = cache.IMAGES.get(redis_client, url)
     if img_cached:
-        return {"image": img_cached.decode('utf-8')}
+        return {"image": img_cached}
     
-    screenshot_path = await capture_screenshot(url)
+    screenshot = await capture_screenshot_bytes(url)
+    image, extension, content_type = await asyncio.to_thread(encode_image, screenshot)
     
-    # Step 2: Define S3 bucket and object name
-    bucket_name = os.getenv('AWS_BUCKET')
+    # Upload straight from memory and get public URL
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    object_name = f"{timestamp}.png"
-    
-    # Step 3: Upload to S3 and get public URL
-    image_url = upload_to_s3(screenshot_path, bucket_name, object_name)
+    object_name = f"{timestamp}.{extension}"
+    image_url = await storage.asave(object_name, image, content_type)
+    if image_url is None:
+        return {"error": "Failed to store preview image"}, 500
     
-    redis_client.set(f"{url}:img", image_url)
+    cache.IMAGES.set(redis_client, url, image_url)
     return {
         'image': image_url
     }
 
 
+@app.route("/cache-stats/")
+def cache_stats() -> dict:
+    """Hit ratio, key count and stored bytes of each cache namespace."""
+    return cache.stats(redis_client)
+
+
+@app.route("/db-pool-stats/")
+def db_pool_stats() -> dict:
+    """Connection checkout waits and pool occupancy of each running Celery worker process."""
+    return worker_pool_stats(redis_client)
+
+
 @app.route('/stream/<session_id>')
 def stream(session_id: str):
     """SSE endpoint for streaming question updates"""
-    def generate():
-        # Subscribe to Redis channel
-        pubsub = redis_client.pubsub()
-        pubsub.subscribe(f'questions:{session_id}')
-        
-        try:
-            while True:
-                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
-                if message is not None:
-                    data = json.loads(message['data'])
-                    print(data)
-                    # Check if processing is complete
-                    if data.get('status') == 'complete':
-                        break
-                    
-                    yield f"data: {json.dumps(data)}\n\n"
-                
-                time.sleep(0.1)
-                
-        finally:
-            pubsub.unsubscribe(f'questions:{session_id}')
-            pubsub.close()
-    
     return Response(
-        generate(),
+        session_streams.stream(session_id, request.headers.get('Last-Event-ID')),
         mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
     
 
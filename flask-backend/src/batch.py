@@ -0,0 +1,334 @@
+"""
+Question generation for many websites in one job, e.g. an onboarding
+import of thousands of domains.
+
+URLs are scraped and sent to the LLMs with a global and a per-domain
+concurrency limit, and the results are written to the database in bulk.
+Finished URLs are checkpointed in Redis, so running a batch again (with the
+same URLs, or the same `--batch-id`) resumes where it stopped and retries
+the URLs that failed.
+
+Usage:
+    python -m src.batch urls.txt
+    python -m src.batch urls.txt --queue    # run it on a Celery worker instead
+    python -m src.batch --status <batch_id>
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+import redis.asyncio as async_redis
+
+from src.crud import bulk_create_websites_with_questions, get_urls_with_questions
+from src.db import async_session, dispose_engine
+from src.task import ProcessingError, cache_links, cache_questions, celery, run_in_worker_loop, scraped_texts
+from src.utils.llm import QuestionGenerator
+from src.utils.llm_cache import LLMCache
+from src.utils.scraper import WebsiteScraper
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 20))
+BATCH_PER_DOMAIN = int(os.getenv("BATCH_PER_DOMAIN", 2))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 8))
+BATCH_WRITE_SIZE = int(os.getenv("BATCH_WRITE_SIZE", 50))
+BATCH_TTL = int(os.getenv("BATCH_TTL", 7 * 24 * 3600))
+BATCH_PROGRESS_INTERVAL = float(os.getenv("BATCH_PROGRESS_INTERVAL", 30))
+# URLs looked up per query when skipping websites that already have questions
+LOOKUP_CHUNK = 1000
+
+
+def read_urls(path: str) -> List[str]:
+    """URLs of a file, one per line. Blank lines and # comments are skipped, duplicates dropped."""
+    with open(path, encoding='utf-8') as f:
+        lines = (line.split('#', 1)[0].strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line))
+
+
+def batch_id_for(urls: List[str]) -> str:
+    """Default batch ID, the same for the same URLs so a rerun resumes."""
+    return hashlib.sha256('\n'.join(urls).encode('utf-8')).hexdigest()[:16]
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class BatchCheckpoint:
+    """
+    Redis record of a batch: the URLs finished (stored, or skipped because
+    they already had questions), the URLs that failed with their error, and
+    the latest progress report.
+    """
+
+    def __init__(self, redis_client: async_redis.Redis, batch_id: str, ttl: int = BATCH_TTL):
+        self.redis_client = redis_client
+        self.batch_id = batch_id
+        self.ttl = ttl
+        self.progress_key = f"batch:{batch_id}"
+        self.done_key = f"batch:{batch_id}:done"
+        self.failed_key = f"batch:{batch_id}:failed"
+
+    async def done_urls(self) -> Set[str]:
+        return {
+            url.decode('utf-8') if isinstance(url, bytes) else url
+            for url in await self.redis_client.smembers(self.done_key)
+        }
+
+    async def mark_done(self, urls: List[str]) -> None:
+        if not urls:
+            return
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.sadd(self.done_key, *urls)
+            pipe.hdel(self.failed_key, *urls)
+            pipe.expire(self.done_key, self.ttl)
+            await pipe.execute()
+
+    async def mark_failed(self, url: str, error: str) -> None:
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.failed_key, url, error)
+            pipe.expire(self.failed_key, self.ttl)
+            await pipe.execute()
+
+    async def save_progress(self, progress: Dict[str, Any]) -> None:
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.progress_key, mapping=progress)
+            pipe.expire(self.progress_key, self.ttl)
+            await pipe.execute()
+
+
+async def batch_status(redis_client: async_redis.Redis, batch_id: str) -> Dict[str, Any]:
+    """Latest progress report of a batch plus the URLs that failed and why."""
+    checkpoint = BatchCheckpoint(redis_client, batch_id)
+    progress = await redis_client.hgetall(checkpoint.progress_key)
+    failed = await redis_client.hgetall(checkpoint.failed_key)
+    decode = lambda value: value.decode('utf-8') if isinstance(value, bytes) else value
+    return {
+        **{decode(field): decode(value) for field, value in progress.items()},
+        'failures': {decode(url): decode(error) for url, error in failed.items()},
+    }
+
+
+class BatchProgress:
+    """Counts of a running batch and its throughput in URLs per minute."""
+
+    def __init__(self, checkpoint: BatchCheckpoint, total: int, already_done: int):
+        self.checkpoint = checkpoint
+        self.total = total
+        self.counts = {'stored': 0, 'skipped': already_done, 'failed': 0}
+        self.started = time.monotonic()
+        self.processed = 0  # URLs finished by this run, for the rate
+        self._last_report = self.started
+
+    def finished(self, outcome: str, count: int = 1) -> None:
+        self.counts[outcome] += count
+        self.processed += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed * 60 if elapsed else 0.0
+        remaining = self.total - sum(self.counts.values())
+        return {
+            'total': self.total,
+            **self.counts,
+            'urls_per_min': round(rate, 1),
+            'eta_seconds': round(remaining / rate * 60) if rate else -1,
+        }
+
+    async def report(self, force: bool = False) -> None:
+        """Logs and checkpoints the progress, at most every BATCH_PROGRESS_INTERVAL seconds unless forced."""
+        now = time.monotonic()
+        if not force and now - self._last_report < BATCH_PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        snapshot = self.snapshot()
+        logger.info(
+            f"Batch {self.checkpoint.batch_id}: {sum(self.counts.values())}/{self.total} done "
+            f"({snapshot['stored']} stored, {snapshot['skipped']} skipped, {snapshot['failed']} failed), "
+            f"{snapshot['urls_per_min']} URLs/min"
+        )
+        await self.checkpoint.save_progress(snapshot)
+
+
+async def run_batch(
+    urls: List[str],
+    redis_client: async_redis.Redis,
+    batch_id: Optional[str] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    per_domain: int = BATCH_PER_DOMAIN,
+    llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+    write_size: int = BATCH_WRITE_SIZE
+) -> Dict[str, Any]:
+    """
+    Generates and stores questions for every URL not finished by an earlier
+    run of the batch.
+    
+    Args:
+        urls: Websites to process
+        redis_client: Redis client for the checkpoint and caches
+        batch_id: Checkpoint to resume, defaults to one derived from `urls`
+        concurrency: Websites scraped and generated at the same time
+        per_domain: Websites of the same domain processed at the same time
+        llm_concurrency: Websites in question generation at the same time
+        write_size: Websites stored per database transaction
+    
+    Returns:
+        Final progress report, with the counts of stored, skipped and failed URLs
+    """
+    urls = list(dict.fromkeys(urls))
+    batch_id = batch_id or batch_id_for(urls)
+    checkpoint = BatchCheckpoint(redis_client, batch_id)
+    done = await checkpoint.done_urls()
+    remaining = [url for url in urls if url not in done]
+    progress = BatchProgress(checkpoint, len(urls), len(urls) - len(remaining))
+    
+    # Websites that got questions some other way don't need the work
+    async with async_session() as db:
+        stored = set()
+        for start in range(0, len(remaining), LOOKUP_CHUNK):
+            stored |= await get_urls_with_questions(db, remaining[start:start + LOOKUP_CHUNK])
+    if stored:
+        await checkpoint.mark_done(list(stored))
+        progress.finished('skipped', len(stored))
+        remaining = [url for url in remaining if url not in stored]
+    logger.info(f"Batch {batch_id}: {len(remaining)} of {len(urls)} URLs to process")
+    
+    slots = asyncio.Semaphore(concurrency)
+    domain_slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_domain))
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    pending: List[Dict[str, Any]] = []
+    write_lock = asyncio.Lock()
+    
+    async def generate(url: str) -> Dict[str, Any]:
+        scraper = WebsiteScraper(url)
+        await scraper.scrape_all()
+        if not scraper.home_page_text:
+            raise ProcessingError(f"Nothing scraped from {url}")
+        scraped_info = scraper.__json__()
+        async with llm_slots:
+            questions = await QuestionGenerator(scraped_info, cache=LLMCache(redis_client)).async_generate_questions()
+        if not questions:
+            raise ProcessingError(f"No questions generated for {url}")
+        return {
+            'url': url,
+            'questions': questions,
+            'pages': scraper.pages,
+            'texts': scraped_texts(scraped_info),
+            'links': list(scraper.links),
+        }
+    
+    async def flush() -> None:
+        async with write_lock:
+            sites = pending[:]
+            pending.clear()
+            if not sites:
+                return
+            try:
+                async with async_session() as db:
+                    website_ids = await bulk_create_websites_with_questions(db, sites)
+            except Exception as e:
+                # Fail this write's sites so a rerun retries them, and keep the batch going
+                logger.error(f"Batch {batch_id}: error storing {len(sites)} websites: {str(e)}")
+                for site in sites:
+                    await checkpoint.mark_failed(site['url'], str(e) or type(e).__name__)
+                progress.finished('failed', len(sites))
+                await progress.report()
+                return
+            for site in sites:
+                if site['url'] in website_ids:
+                    await cache_questions(redis_client, site['url'], site['questions'])
+                    await cache_links(redis_client, site['url'], site['links'])
+            await checkpoint.mark_done([site['url'] for site in sites])
+            progress.finished('stored', len(website_ids))
+            progress.finished('skipped', len(sites) - len(website_ids))
+            await progress.report()
+    
+    async def process(url: str) -> None:
+        # Wait for the domain first so a busy domain doesn't hold global slots
+        async with domain_slots[domain_of(url)], slots:
+            try:
+                site = await generate(url)
+            except Exception as e:
+                logger.error(f"Batch {batch_id}: error processing {url}: {str(e)}")
+                await checkpoint.mark_failed(url, str(e) or type(e).__name__)
+                progress.finished('failed')
+                await progress.report()
+                return
+        pending.append(site)
+        if len(pending) >= write_size:
+            await flush()
+    
+    await asyncio.gather(*(process(url) for url in remaining))
+    await flush()
+    await progress.report(force=True)
+    return progress.snapshot()
+
+
+@celery.task
+def batch_generate_task(urls: List[str], batch_id: Optional[str] = None) -> Dict[str, Any]:
+    redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+    return run_in_worker_loop(run_batch(urls, redis_client, batch_id=batch_id))
+
+
+async def _run_here(args: argparse.Namespace, urls: List[str], batch_id: str) -> Dict[str, Any]:
+    redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+    try:
+        return await run_batch(
+            urls,
+            redis_client,
+            batch_id=batch_id,
+            concurrency=args.concurrency,
+            per_domain=args.per_domain,
+            llm_concurrency=args.llm_concurrency,
+            write_size=args.write_size,
+        )
+    finally:
+        await redis_client.aclose()
+        await dispose_engine()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="file with one URL per line")
+    parser.add_argument("--batch-id", default=None, help="checkpoint to resume, derived from the URLs by default")
+    parser.add_argument("--queue", action="store_true", help="run the batch on a Celery worker")
+    parser.add_argument("--status", metavar="BATCH_ID", default=None, help="print the progress of a batch")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--per-domain", type=int, default=BATCH_PER_DOMAIN)
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--write-size", type=int, default=BATCH_WRITE_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.status:
+        async def status() -> Dict[str, Any]:
+            redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+            try:
+                return await batch_status(redis_client, args.status)
+            finally:
+                await redis_client.aclose()
+        print(json.dumps(asyncio.run(status()), indent=2))
+        return
+    if not args.path:
+        parser.error("a file of URLs is required")
+    
+    urls = read_urls(args.path)
+    batch_id = args.batch_id or batch_id_for(urls)
+    if args.queue:
+        batch_generate_task.delay(urls, batch_id)
+        print(f"Queued batch {batch_id} of {len(urls)} URLs, check it with --status {batch_id}")
+        return
+    print(json.dumps(asyncio.run(_run_here(args, urls, batch_id)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
-from typing import Any, Dict, List, Optional
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import func
 from datetime import datetime
 from sqlalchemy.ext.asyncio import  AsyncSession
-from src.models import Website, Question, QuestionOption
+from src.models import Website, Page, PageContent, Question, QuestionOption
+from src.utils import content_store
 
 
 
@@ -59,47 +65,229 @@ async def bulk_create_questions_for_website(
     
     Returns:
         List of created Question objects with their options loaded
+    
+    Questions and options are each written with multi-row
+    INSERT ... RETURNING, so this takes three round trips (with the commit)
+    until a table gets more rows than fit in one statement.
     """
-    # First verify the website exists
-    website = await db.execute(
-        select(Website).where(Website.id == website_id)
-    )
-    if not website.scalar_one_or_none():
+    try:
+        questions = await _insert_questions(db, website_id, questions_data)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
         raise ValueError(f"Website with ID {website_id} not found")
+    return questions
 
-    # Create all questions first
-    questions = [
-        Question(
-            website_id=website_id,
-            text=q_data['question']
-        )
-        for q_data in questions_data
-    ]
-    db.add_all(questions)
-    await db.flush()  # Flush to get question IDs without committing
-
-    # Create all options for all questions
-    all_options = []
-    for question, q_data in zip(questions, questions_data):
-        options = [
-            QuestionOption(
-                question_id=question.id,
-                text=option_text
-            )
-            for option_text in q_data['options']
+async def _insert_questions(
+    db: AsyncSession,
+    website_id: int,
+    questions_data: List[Dict[str, Any]]
+) -> List[Question]:
+    """Insert questions and their options without committing, see bulk_create_questions_for_website."""
+    return (await _insert_question_sets(db, [(website_id, questions_data)]))[0]
+
+async def _insert_question_sets(
+    db: AsyncSession,
+    question_sets: List[Tuple[int, List[Dict[str, Any]]]]
+) -> List[List[Question]]:
+    """Insert the questions of several websites in the same two statements, returning them per website."""
+    all_data = [q_data for _, questions_data in question_sets for q_data in questions_data]
+    if not all_data:
+        return [[] for _ in question_sets]
+    
+    questions = (await db.scalars(
+        insert(Question).returning(Question),
+        [
+            {'website_id': website_id, 'text': q_data['question']}
+            for website_id, questions_data in question_sets
+            for q_data in questions_data
         ]
-        all_options.extend(options)
+    )).all()
+    # IDs are assigned in VALUES order. RETURNING order isn't guaranteed,
+    # and asking SQLAlchemy to sort falls back to one INSERT per row on
+    # some backends, so sort on the IDs instead.
+    questions = sorted(questions, key=lambda question: question.id)
+    
+    option_rows = [
+        {'question_id': question.id, 'text': option_text}
+        for question, q_data in zip(questions, all_data)
+        for option_text in q_data['options']
+    ]
+    options = sorted((await db.scalars(
+        insert(QuestionOption).returning(QuestionOption),
+        option_rows
+    )).all(), key=lambda option: option.id) if option_rows else []
+    
+    # Attach the options we just inserted instead of reloading them per question
+    options_by_question: Dict[int, List[QuestionOption]] = {question.id: [] for question in questions}
+    for option in options:
+        options_by_question[option.question_id].append(option)
+    for question in questions:
+        set_committed_value(question, 'options', options_by_question[question.id])
+    
+    per_website, offset = [], 0
+    for _, questions_data in question_sets:
+        per_website.append(questions[offset:offset + len(questions_data)])
+        offset += len(questions_data)
+    return per_website
+
+async def create_website_with_questions(
+    db: AsyncSession,
+    url: str,
+    questions_data: List[Dict[str, Any]],
+    pages: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+    texts: Optional[Dict[str, str]] = None
+) -> Optional[int]:
+    """
+    Store a website with its generated questions and scraped pages (see
+    save_pages) in one transaction, safe against other workers doing the
+    same for the URL at the same time.
+    
+    The website is inserted with ON CONFLICT DO NOTHING. A concurrent insert
+    of the same URL blocks until the other transaction commits, its
+    questions included, so the loser sees them and backs off. A website
+    stored without questions is locked and filled in.
+    
+    Returns:
+        ID of the website, or None when another worker already stored questions for it
+    """
+    website_id = await db.scalar(
+        _dialect_insert(db, Website)
+        .values(url=url)
+        .on_conflict_do_nothing(index_elements=[Website.url])
+        .returning(Website.id)
+    )
+    if website_id is None:
+        website_id = await db.scalar(select(Website.id).where(Website.url == url).with_for_update())
+        has_questions = await db.scalar(select(exists().where(Question.website_id == website_id)))
+        if has_questions:
+            await db.rollback()
+            return None
+    
+    await _insert_questions(db, website_id, questions_data)
+    await _store_pages(db, website_id, pages or {}, texts or {})
+    await db.commit()
+    return website_id
 
-    if all_options:
-        db.add_all(all_options)
+def _dialect_insert(db: AsyncSession, table):
+    """INSERT construct of the session's dialect, which is where ON CONFLICT lives."""
+    if db.bind.dialect.name == 'sqlite':
+        return sqlite_insert(table)
+    return postgresql_insert(table)
+
+async def save_pages(
+    db: AsyncSession,
+    website_id: int,
+    pages: Dict[str, Dict[str, Optional[str]]],
+    texts: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Replace the stored pages of a website: their validators (etag,
+    last_modified, content_hash) and, from `texts`, their extracted text.
     
+    Texts go to the content store compressed and keyed by their hash, so a
+    text shared by many pages or sites (a common landing page, an empty
+    template) is stored once.
+    """
+    await _store_pages(db, website_id, pages, texts or {})
     await db.commit()
 
-    # Refresh questions to get their options
-    for question in questions:
-        await db.refresh(question, ['options'])
+async def _store_pages(
+    db: AsyncSession,
+    website_id: int,
+    pages: Dict[str, Dict[str, Optional[str]]],
+    texts: Dict[str, str]
+) -> None:
+    """Write pages and their texts without committing, see save_pages."""
+    await _store_page_sets(db, {website_id: (pages, texts)})
+
+async def _store_page_sets(
+    db: AsyncSession,
+    page_sets: Dict[int, Tuple[Dict[str, Dict[str, Optional[str]]], Dict[str, str]]]
+) -> None:
+    """Replace the pages of several websites in the same few statements."""
+    text_hashes = {
+        (website_id, url): content_store.text_hash(texts[url])
+        for website_id, (pages, texts) in page_sets.items()
+        for url in pages
+        if texts.get(url)
+    }
+    if text_hashes:
+        rows = {}
+        for (website_id, url), text_hash in text_hashes.items():
+            if text_hash not in rows:
+                text = page_sets[website_id][1][url]
+                rows[text_hash] = {'hash': text_hash, 'size': len(text), 'data': content_store.compress(text)}
+        # Stored texts are upserted too rather than skipped: the no-op update
+        # locks their rows until commit, so delete_orphaned_page_contents
+        # can't remove one before the pages referring to it are written.
+        upsert = _dialect_insert(db, PageContent)
+        await db.execute(
+            upsert.on_conflict_do_update(index_elements=[PageContent.hash], set_={'size': upsert.excluded.size}),
+            list(rows.values())
+        )
     
-    return questions
+    await db.execute(delete(Page).where(Page.website_id.in_(list(page_sets))))
+    page_rows = [
+        {
+            'website_id': website_id,
+            'url': url,
+            'etag': validators.get('etag'),
+            'last_modified': validators.get('last_modified'),
+            'content_hash': validators['content_hash'],
+            'text_hash': text_hashes.get((website_id, url)),
+        }
+        for website_id, (pages, _) in page_sets.items()
+        for url, validators in pages.items()
+    ]
+    if page_rows:
+        await db.execute(insert(Page), page_rows)
+
+async def bulk_create_websites_with_questions(db: AsyncSession, sites: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Store many websites with their questions, pages and texts in one
+    transaction, e.g. a batch of onboarded sites.
+    
+    Args:
+        db: Database session
+        sites: Dictionaries with the `url`, `questions` (as for
+            bulk_create_questions_for_website), `pages` and `texts` (as
+            for save_pages) of each website
+    
+    Returns:
+        IDs of the websites stored, keyed by URL. Websites that already had
+        questions are left alone and missing.
+    
+    The number of statements doesn't grow with the number of sites.
+    """
+    sites = list({site['url']: site for site in sites}.values())
+    if not sites:
+        return {}
+    result = await db.execute(
+        _dialect_insert(db, Website)
+        .values([{'url': site['url']} for site in sites])
+        .on_conflict_do_nothing(index_elements=[Website.url])
+        .returning(Website.id, Website.url)
+    )
+    website_ids = {url: website_id for website_id, url in result}
+    stored = [site['url'] for site in sites if site['url'] not in website_ids]
+    if stored:
+        # Stored before, fill in the ones without questions like create_website_with_questions
+        result = await db.execute(
+            select(Website.id, Website.url)
+            .where(Website.url.in_(stored), ~exists().where(Question.website_id == Website.id))
+            .with_for_update()
+        )
+        website_ids.update({url: website_id for website_id, url in result})
+    
+    sites = [site for site in sites if site['url'] in website_ids]
+    await _insert_question_sets(db, [(website_ids[site['url']], site['questions']) for site in sites])
+    await _store_page_sets(db, {
+        website_ids[site['url']]: (site.get('pages') or {}, site.get('texts') or {})
+        for site in sites
+    })
+    await db.commit()
+    return website_ids
 
 # Read Functions
 async def get_website_by_id(db: AsyncSession, website_id: int) -> Optional[Website]:
@@ -118,9 +306,84 @@ async def get_website_by_url(db: AsyncSession, url: str) -> Optional[Website]:
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
+async def get_website_id(db: AsyncSession, url: str) -> Optional[int]:
+    """Get the ID of a website by URL, without loading the row or its relationships."""
+    return await db.scalar(select(Website.id).where(Website.url == url))
+
+async def website_exists(db: AsyncSession, url: str) -> bool:
+    """Check whether a website URL is stored."""
+    return bool(await db.scalar(select(exists().where(Website.url == url))))
+
+async def get_questions_from_url(db: AsyncSession, url: str) -> Optional[List[Question]]:
+    """Get the stored questions (with options) for a website URL, or None if it was never processed."""
+    query = select(Question).join(Website).where(Website.url == url).order_by(Question.id).options(
+        selectinload(Question.options)
+    )
+    result = await db.execute(query)
+    return result.scalars().all() or None
+
+async def get_urls_with_questions(db: AsyncSession, urls: List[str]) -> Set[str]:
+    """Get which of `urls` are stored with questions."""
+    query = select(Website.url).where(Website.url.in_(urls), exists().where(Question.website_id == Website.id))
+    return set((await db.scalars(query)).all())
+
+async def get_tracked_urls(db: AsyncSession, urls: List[str]) -> Set[str]:
+    """Get which of `urls` are stored websites."""
+    return set((await db.scalars(select(Website.url).where(Website.url.in_(urls)))).all())
+
+async def get_page_validators(db: AsyncSession, website_id: int) -> Dict[str, Dict[str, Optional[str]]]:
+    """Get the stored validators of every page of a website, keyed by page URL."""
+    result = await db.execute(select(Page).where(Page.website_id == website_id))
+    return {
+        page.url: {'etag': page.etag, 'last_modified': page.last_modified, 'content_hash': page.content_hash}
+        for page in result.scalars()
+    }
+
+async def get_page_texts(db: AsyncSession, website_id: int) -> content_store.LazyTexts:
+    """Get the stored text of every page of a website keyed by page URL, decompressed when first read."""
+    query = select(Page.url, PageContent.data).join(PageContent, Page.text_hash == PageContent.hash).where(
+        Page.website_id == website_id
+    )
+    result = await db.execute(query)
+    return content_store.LazyTexts({url: data for url, data in result})
+
+async def get_legacy_content(db: AsyncSession, website_id: int) -> Optional[str]:
+    """Get the main page text stored on the website row before the content store existed."""
+    return await db.scalar(select(Website.content).where(Website.id == website_id))
+
 async def get_all_websites(db) -> List[Website]:
-    """Get all websites (without loading relationships)."""
-    query = select(Website)
+    """Get all websites (without loading relationships or content). Prefer list_websites on large tables."""
+    query = select(Website).options(defer(Website.content))
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def list_websites(db: AsyncSession, limit: int = 100, after_id: Optional[int] = None) -> List[Website]:
+    """
+    Get a page of websites ordered by ID (without loading relationships or content).
+    
+    Keyset paginated: pass the ID of the last website of a page as `after_id`
+    to get the next one, which stays fast however deep the page is.
+    """
+    query = select(Website).options(load_only(Website.id, Website.url, Website.last_scraped))
+    if after_id is not None:
+        query = query.where(Website.id > after_id)
+    query = query.order_by(Website.id).limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def get_stale_websites(
+    db: AsyncSession,
+    scraped_before: datetime,
+    limit: int,
+    urls: Optional[List[str]] = None
+) -> List[Website]:
+    """Get up to `limit` websites last scraped before `scraped_before`, oldest first (without loading relationships or content)."""
+    query = select(Website).where(Website.last_scraped < scraped_before).options(
+        load_only(Website.id, Website.url, Website.last_scraped)
+    )
+    if urls is not None:
+        query = query.where(Website.url.in_(urls))
+    query = query.order_by(Website.last_scraped).limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -144,4 +407,28 @@ async def get_options_by_question_id(db: AsyncSession, question_id: int) -> List
     """Get all options for a specific question."""
     query = select(QuestionOption).where(QuestionOption.question_id == question_id)
     result = await db.execute(query)
-    return result.scalars().all()
\ No newline at end of file
+    return result.scalars().all()
+
+# Update Functions
+async def touch_website(db: AsyncSession, website_id: int, content: Optional[str] = None) -> None:
+    """Mark a website as just scraped, replacing its stored main page text if given."""
+    values = {'last_scraped': func.now()}
+    if content is not None:
+        values['content'] = content
+    await db.execute(update(Website).where(Website.id == website_id).values(**values))
+    await db.commit()
+
+# Delete Functions
+async def delete_questions_for_website(db: AsyncSession, website_id: int) -> None:
+    """Delete all questions of a website along with their options, without committing."""
+    question_ids = select(Question.id).where(Question.website_id == website_id)
+    await db.execute(delete(QuestionOption).where(QuestionOption.question_id.in_(question_ids)))
+    await db.execute(delete(Question).where(Question.website_id == website_id))
+
+async def delete_orphaned_page_contents(db: AsyncSession) -> int:
+    """Delete stored page texts no page refers to any more. Returns how many were deleted."""
+    result = await db.execute(
+        delete(PageContent).where(~exists().where(Page.text_hash == PageContent.hash))
+    )
+    await db.commit()
+    return result.rowcount
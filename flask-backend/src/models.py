@@ -1,8 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import String, Text, DateTime, ForeignKey, Integer, JSON, LargeBinary
 from sqlalchemy.sql import func
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -13,17 +13,42 @@ class Website(Base):
     
     id: Mapped[int] = mapped_column(primary_key=True)
     url: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    # Superseded by page_contents, only read for websites stored before it
     content: Mapped[str] = mapped_column(Text, nullable=True)
-    last_scraped: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    last_scraped: Mapped[datetime] = mapped_column(DateTime, default=func.now(), index=True)
     
     questions: Mapped[List["Question"]] = relationship(back_populates="website")
+    pages: Mapped[List["Page"]] = relationship(back_populates="website")
     
 
+class Page(Base):
+    __tablename__ = 'pages'
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    website_id: Mapped[int] = mapped_column(ForeignKey('websites.id'), index=True)
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    etag: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    text_hash: Mapped[Optional[str]] = mapped_column(ForeignKey('page_contents.hash'), nullable=True, index=True)
+    
+    website: Mapped["Website"] = relationship(back_populates="pages")
+    text: Mapped[Optional["PageContent"]] = relationship()
+
+
+class PageContent(Base):
+    """Compressed page text, stored once however many pages share it."""
+    __tablename__ = 'page_contents'
+    
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
 class Question(Base):
     __tablename__ = 'questions'
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    website_id: Mapped[int] = mapped_column(ForeignKey('websites.id'))
+    website_id: Mapped[int] = mapped_column(ForeignKey('websites.id'), index=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
     
     website: Mapped["Website"] = relationship(back_populates="questions")
@@ -34,7 +59,7 @@ class QuestionOption(Base):
     __tablename__ = 'question_options'
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    question_id: Mapped[int] = mapped_column(ForeignKey('questions.id'))
+    question_id: Mapped[int] = mapped_column(ForeignKey('questions.id'), index=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
     
     question: Mapped["Question"] = relationship(back_populates="options")
@@ -1,18 +1,30 @@
+import os
+import socket
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+import redis
 import redis.asyncio as async_redis
 
-from src.crud import create_website, bulk_create_questions_for_website, get_questions_from_url
-from src.db import db_session
+from src.crud import (
+    create_website_with_questions, bulk_create_questions_for_website, get_questions_from_url, get_website_id,
+    get_page_validators, save_pages, touch_website, delete_questions_for_website, get_stale_websites,
+    get_questions_by_website_id, get_page_texts, get_legacy_content, delete_orphaned_page_contents, get_tracked_urls
+)
+from src.db import db_session, dispose_engine, pool_stats, reset_engine
+from src.utils.background_loop import BackgroundLoop
 from src.utils.llm import QuestionGenerator
+from src.utils.llm_cache import LLMCache
 from src.utils.utils import format_question_for_api
-from typing import Dict, List, Optional
+from src.utils import cache, popularity, singleflight, task_payload
+from src.utils.streams import publish_event
+from src.utils.scraper import WebsiteScraper
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
 import json
 import logging
 from dataclasses import dataclass
-from asgiref.sync import async_to_sync
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -20,9 +32,99 @@ logger = logging.getLogger(__name__)
 celery = Celery(
     "task",
     broker='redis://localhost:6379/0',
-    include=["src.task"]
+    include=["src.task", "src.batch"]
+)
+
+WARM_INTERVAL = float(os.getenv("WARM_INTERVAL", 600))
+WARM_BATCH_SIZE = int(os.getenv("WARM_BATCH_SIZE", 50))
+WARM_CONCURRENCY = int(os.getenv("WARM_CONCURRENCY", 4))
+REFRESH_MAX_AGE = float(os.getenv("REFRESH_MAX_AGE", 24 * 3600))
+# Seconds between database pool stats reports of each worker process, 0 disables them
+POOL_STATS_INTERVAL = float(os.getenv("DB_POOL_STATS_INTERVAL", 60))
+POOL_STATS_KEY_PREFIX = "db:pool-stats"
+TASK_SERIALIZER = os.getenv("CELERY_TASK_SERIALIZER", "msgpack")
+# e.g. zlib or zstd, None sends messages uncompressed
+TASK_COMPRESSION = os.getenv("CELERY_TASK_COMPRESSION") or None
+
+celery.conf.update(
+    task_serializer=TASK_SERIALIZER,
+    accept_content=['msgpack', 'json'],
+    task_compression=TASK_COMPRESSION,
 )
 
+celery.conf.beat_schedule = {
+    'warm-cache': {
+        'task': 'src.task.warm_cache_task',
+        'schedule': WARM_INTERVAL,
+    },
+}
+
+T = TypeVar("T")
+_worker_loop: Optional[BackgroundLoop] = None
+
+
+def run_in_worker_loop(coro: Awaitable[T]) -> T:
+    """
+    Runs a task's coroutine on this process' long-lived event loop.
+
+    Pooled asyncpg connections belong to the loop that opened them, so
+    giving every task a fresh loop (as async_to_sync does) would make the
+    connection pool unusable between tasks.
+    """
+    global _worker_loop
+    if _worker_loop is None:
+        _worker_loop = BackgroundLoop("celery-tasks")
+        if POOL_STATS_INTERVAL > 0:
+            redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+            asyncio.run_coroutine_threadsafe(report_pool_stats(redis_client), _worker_loop.loop)
+    return _worker_loop.run_sync(coro)
+
+
+async def report_pool_stats(redis_client: async_redis.Redis, interval: float = POOL_STATS_INTERVAL) -> None:
+    """
+    Logs this process' database pool stats every `interval` seconds while
+    it runs tasks, and keeps the latest in Redis for `worker_pool_stats`.
+    """
+    key = f"{POOL_STATS_KEY_PREFIX}:{socket.gethostname()}:{os.getpid()}"
+    while True:
+        await asyncio.sleep(interval)
+        stats = pool_stats()
+        logger.info(f"Database pool stats: {stats}")
+        try:
+            # Expires once the process stops reporting
+            await redis_client.set(key, json.dumps(stats), ex=max(1, int(interval * 3)))
+        except Exception as e:
+            logger.warning(f"Error publishing database pool stats: {str(e)}")
+
+
+def worker_pool_stats(redis_client: redis.Redis) -> Dict[str, dict]:
+    """Latest database pool stats of every running worker process, keyed by `host:pid`."""
+    keys = list(redis_client.scan_iter(match=f"{POOL_STATS_KEY_PREFIX}:*", count=500))
+    if not keys:
+        return {}
+    prefix = len(POOL_STATS_KEY_PREFIX) + 1
+    return {
+        (key.decode('utf-8') if isinstance(key, bytes) else key)[prefix:]: json.loads(value)
+        for key, value in zip(keys, redis_client.mget(keys))
+        if value is not None
+    }
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs) -> None:
+    """Prefork children get their own loop and connection pool instead of the parent's."""
+    global _worker_loop
+    _worker_loop = None  # The loop thread didn't survive the fork
+    reset_engine()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs) -> None:
+    logger.info(f"Database pool stats: {pool_stats()}")
+    if _worker_loop is not None:
+        _worker_loop.run_sync(dispose_engine())
+        _worker_loop.stop()
+
 
 
 @dataclass
@@ -38,15 +140,15 @@ class ProcessingError(Exception):
 @celery.task
 def process_links_task(
     session_id: str,
-    scraped_info: dict,
+    payload: dict,
 ):
     redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
-    async_to_sync(process_links)(session_id, scraped_info, redis_client)
+    run_in_worker_loop(process_links(session_id, payload, redis_client))
 
 
 async def process_links(
     session_id: str,
-    scraped_info: dict,
+    payload: dict,
     redis_client: async_redis.Redis
 ) -> None:
     """
@@ -54,7 +156,7 @@ async def process_links(
     
     Args:
         session_id: Unique identifier for the processing session
-        scraped_info: Dictionary of relevant info from scraped user's request
+        payload: Scraped info of the user's request, see `task_payload.dump`
         redis_client: Redis client instance for caching and pub/sub
         question_generator: Instance of QuestionGenerator
     
@@ -62,7 +164,8 @@ async def process_links(
         ProcessingError: If there's an error during processing
     """
     try:
-        question_generator = QuestionGenerator(scraped_info)
+        scraped_info = await task_payload.load(redis_client, payload)
+        question_generator = QuestionGenerator(scraped_info, cache=LLMCache(redis_client))
         # Process main page
         await process_main_page(
             session_id=session_id,
@@ -85,42 +188,330 @@ async def process_main_page(
     redis_client: async_redis.Redis,
     question_generator: QuestionGenerator
 ) -> None:
-    """Processes the main page content and generates questions."""
+    """
+    Processes the main page content and generates questions. Questions
+    generated for this session are published one by one as the LLM
+    finishes them, stored or cached ones all at once.
+    """
     try:
-        cached_questions = await get_cached_questions(redis_client, question_generator.url_info['url'])
+        url = question_generator.url_info['url']
+        published = 0
+        
+        async def publish_question(question: dict) -> None:
+            nonlocal published
+            await publish_questions(
+                session_id=session_id,
+                redis_client=redis_client,
+                payload=QuestionPayload(link=url, questions=[question])
+            )
+            published += 1
+        
+        cached_questions = await get_cached_questions(redis_client, url)
         if cached_questions:
             questions = cached_questions
-            await asyncio.sleep(1) # allow frontend to connect
         else:
-            questions = await get_questions_from_url(question_generator.url_info['url'])
+            questions = await get_questions_from_url(db, url)
             if questions is None:
-                questions = question_generator.generate_questions()
-                if len(questions) > 0:
-                    await cache_questions(redis_client, question_generator.url_info['url'], questions)
-                    # Add to db
-                    website = await create_website(db, question_generator.url_info['url'], question_generator.url_info['main_page_text'])
-                    await bulk_create_questions_for_website(db, website.id, questions)
+                questions = await generate_questions_once(
+                    db=db,
+                    session_id=session_id,
+                    redis_client=redis_client,
+                    question_generator=question_generator,
+                    on_question=publish_question
+                )
             else:
                 questions = format_question_for_api(questions)
-                
-        await publish_questions(
-            session_id=session_id,
-            redis_client=redis_client,
-            payload=QuestionPayload(link=question_generator.url_info['url'], questions=questions)
-        )
+        
+        # Streamed questions were all published as they came. If another worker
+        # stored its own set meanwhile, the session keeps what it was shown
+        # rather than get the tail of a different set.
+        if not published:
+            await publish_questions(
+                session_id=session_id,
+                redis_client=redis_client,
+                payload=QuestionPayload(link=url, questions=questions)
+            )
     
     except Exception as e:
         logger.error(f"Error processing main page: {str(e)}")
         raise
 
 
+async def generate_questions_once(
+    db: AsyncSession,
+    session_id: str,
+    redis_client: async_redis.Redis,
+    question_generator: QuestionGenerator,
+    on_question: Optional[Callable[[dict], Awaitable[None]]] = None
+) -> List[dict]:
+    """
+    Generates questions for a URL, making sure only one worker at a time pays
+    for the LLM calls. Other workers wait for the leader's cached result.
+    When this worker generates, `on_question` is awaited with each question
+    as it is streamed from the LLM.
+    """
+    url = question_generator.url_info['url']
+    lock_key = questions_lock_key(url)
+    leader = await singleflight.async_acquire(redis_client, lock_key, session_id)
+    if leader is not None:
+        logger.info(f"Questions for {url} are being generated by session {leader}, waiting")
+        await singleflight.async_wait_for(redis_client, cache.QUESTIONS.key(url), lock_key=lock_key)
+        cached_questions = await get_cached_questions(redis_client, url)
+        if cached_questions:
+            return cached_questions
+        # Leader failed or timed out, generate ourselves
+    
+    try:
+        # The lock may have expired on a slow leader that has since finished
+        stored = await get_questions_from_url(db, url)
+        if stored:
+            questions = format_question_for_api(stored)
+            await cache_questions(redis_client, url, questions)
+            return questions
+        
+        if not question_generator.url_info['main_page_text']:
+            # Queued from cached links without a scrape, or the request's scrape failed
+            scraper = WebsiteScraper(url)
+            await scraper.scrape_all()
+            if not scraper.home_page_text:
+                raise ProcessingError(f"Nothing scraped from {url}")
+            question_generator = QuestionGenerator(scraper.__json__(), cache=question_generator.cache)
+        
+        questions = await question_generator.async_generate_questions(on_question=on_question)
+        if len(questions) > 0:
+            # Add to db, unless another worker beat us to it
+            url_info = question_generator.url_info
+            website_id = await create_website_with_questions(
+                db, url, questions, pages=url_info.get('pages'), texts=scraped_texts(url_info)
+            )
+            if website_id is None:
+                logger.info(f"Questions for {url} were already stored by another worker")
+                # Serve the stored set so every session sees the same questions
+                questions = format_question_for_api(await get_questions_from_url(db, url))
+            await cache_questions(redis_client, url, questions)
+    finally:
+        await singleflight.async_release(redis_client, lock_key, session_id)
+    return questions
+
+
+@celery.task
+def refresh_website_task(url: str) -> bool:
+    redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+    return run_in_worker_loop(refresh_website(url, redis_client))
+
+
+@db_session
+async def refresh_website(
+    db: AsyncSession,
+    url: str,
+    redis_client: async_redis.Redis
+) -> bool:
+    """
+    Re-scrapes a stored website, regenerating its questions only if the content changed.
+    
+    Pages are first re-requested conditionally with their stored ETag and
+    Last-Modified. When every page answers 304 or hashes the same as before,
+    the stored questions are kept without parsing anything or calling the LLM.
+    
+    Returns:
+        True if the questions were regenerated
+    """
+    website_id = await get_website_id(db, url)
+    if website_id is None:
+        raise ProcessingError(f"Website {url} is not tracked")
+    
+    validators = await get_page_validators(db, website_id)
+    if validators and await WebsiteScraper(url).check_unchanged(validators):
+        logger.info(f"{url} is unchanged, keeping its questions")
+        await touch_website(db, website_id)
+        if not await get_cached_questions(redis_client, url):
+            stored = await get_questions_by_website_id(db, website_id)
+            if stored:
+                await cache_questions(redis_client, url, format_question_for_api(stored))
+        await cache_links(redis_client, url, [page for page in validators if page != url], overwrite=False)
+        return False
+    
+    scraper = WebsiteScraper(url)
+    await scraper.scrape_all()
+    if not scraper.home_page_text:
+        # Keep the stored questions and pages rather than replace them with nothing
+        raise ProcessingError(f"Nothing scraped from {url}")
+    question_generator = QuestionGenerator(scraper.__json__(), cache=LLMCache(redis_client))
+    questions = await question_generator.async_generate_questions()
+    if not questions:
+        raise ProcessingError(f"No questions generated for {url}")
+    
+    await delete_questions_for_website(db, website_id)
+    await bulk_create_questions_for_website(db, website_id, questions)
+    await save_pages(db, website_id, scraper.pages, scraped_texts(scraper.__json__()))
+    await touch_website(db, website_id)
+    await cache_questions(redis_client, url, questions)
+    await cache_links(redis_client, url, list(scraper.links))
+    return True
+
+
+@celery.task
+def regenerate_website_task(url: str) -> int:
+    redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+    return run_in_worker_loop(regenerate_website(url, redis_client))
+
+
+@db_session
+async def regenerate_website(
+    db: AsyncSession,
+    url: str,
+    redis_client: async_redis.Redis
+) -> int:
+    """
+    Regenerates a stored website's questions from its stored page texts,
+    without fetching anything, e.g. after a prompt or model change.
+    
+    Returns:
+        Number of questions generated
+    """
+    website_id = await get_website_id(db, url)
+    if website_id is None:
+        raise ProcessingError(f"Website {url} is not tracked")
+    
+    texts = await get_page_texts(db, website_id)
+    main_page_text = texts[url] if url in texts else await get_legacy_content(db, website_id)
+    if not main_page_text:
+        raise ProcessingError(f"No stored content for {url}")
+    link_texts = {link: texts[link] for link in texts if link != url}
+    question_generator = QuestionGenerator(
+        {'url': url, 'main_page_text': main_page_text, 'links': list(link_texts), 'link_texts': link_texts},
+        cache=LLMCache(redis_client)
+    )
+    questions = await question_generator.async_generate_questions()
+    if not questions:
+        raise ProcessingError(f"No questions generated for {url}")
+    
+    await delete_questions_for_website(db, website_id)
+    await bulk_create_questions_for_website(db, website_id, questions)
+    await cache_questions(redis_client, url, questions)
+    return len(questions)
+
+
+@celery.task
+def warm_cache_task() -> Dict[str, int]:
+    redis_client = async_redis.Redis(host='localhost', port=6379, db=0)
+    return run_in_worker_loop(warm_cache(redis_client))
+
+
+@db_session
+async def warm_cache(
+    db: AsyncSession,
+    redis_client: async_redis.Redis,
+    batch_size: int = WARM_BATCH_SIZE,
+    concurrency: int = WARM_CONCURRENCY,
+    max_age: float = REFRESH_MAX_AGE
+) -> Dict[str, int]:
+    """
+    Refreshes popular and stale websites ahead of their next visitor.
+    
+    Candidates are the most requested tracked URLs whose questions dropped
+    out of the cache or that weren't scraped for `max_age` seconds, then the
+    longest unscraped tracked websites, busiest first. At most `batch_size`
+    are refreshed per run, `concurrency` at a time. Request counts decay on
+    every run so priority follows recent traffic. A website that fails is
+    left alone for `max_age` seconds, see `back_off_website`.
+    
+    Returns:
+        Counts of refreshed, unchanged, skipped and failed websites
+    """
+    cutoff = datetime.now() - timedelta(seconds=max_age)
+    hot = [url for url, _ in await popularity.hottest(redis_client, batch_size)]
+    if hot:
+        # Untracked URLs can't be refreshed and failed ones wait out their back-off
+        tracked = await get_tracked_urls(db, hot)
+        backed_off = await redis_client.mget([warm_backoff_key(url) for url in hot])
+        hot = [url for url, marker in zip(hot, backed_off) if url in tracked and marker is None]
+    cached = await cache.async_get_many(redis_client, [(cache.QUESTIONS, url) for url in hot]) if hot else []
+    hot_stale = {website.url for website in await get_stale_websites(db, cutoff, batch_size, urls=hot)} if hot else set()
+    candidates = [url for url, questions in zip(hot, cached) if questions is None or url in hot_stale]
+    
+    stale = [website.url for website in await get_stale_websites(db, cutoff, batch_size)]
+    stale_scores = await popularity.scores(redis_client, stale)
+    stale = [url for _, url in sorted(zip(stale_scores, stale), key=lambda pair: -(pair[0] or 0))]
+    candidates = list(dict.fromkeys(candidates + stale))[:batch_size]
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {'refreshed': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+    
+    async def warm(url: str) -> None:
+        # Share the generation lock so we never race a visitor's own generation
+        lock_key = questions_lock_key(url)
+        owner = f"warm:{url}"
+        async with semaphore:
+            if await singleflight.async_acquire(redis_client, lock_key, owner) is not None:
+                counts['skipped'] += 1
+                return
+            try:
+                counts['refreshed' if await refresh_website(url, redis_client) else 'unchanged'] += 1
+            except Exception as e:
+                logger.error(f"Error warming {url}: {str(e)}")
+                counts['failed'] += 1
+                await back_off_website(url, redis_client, max_age)
+            finally:
+                await singleflight.async_release(redis_client, lock_key, owner)
+    
+    await asyncio.gather(*(warm(url) for url in candidates))
+    await popularity.decay(redis_client)
+    try:
+        # Texts left behind by pages the refreshes replaced
+        pruned = await delete_orphaned_page_contents(db)
+        if pruned:
+            logger.info(f"Deleted {pruned} unreferenced page texts")
+    except Exception as e:
+        # Texts being stored again concurrently are locked by their writers,
+        # which win, so this may fail and is left to the next run
+        logger.warning(f"Error pruning page texts: {str(e)}")
+        await db.rollback()
+    logger.info(f"Cache warming: {counts}")
+    return counts
+
+
+@db_session
+async def back_off_website(
+    db: AsyncSession,
+    url: str,
+    redis_client: async_redis.Redis,
+    backoff: float
+) -> None:
+    """
+    Keeps a website that failed to refresh out of cache warming for
+    `backoff` seconds, so sites that keep failing don't take every run's
+    batch. It is marked as just scraped to leave the oldest-first stale
+    window (its stored questions are kept) and flagged in Redis to skip
+    the hot URLs.
+    """
+    await redis_client.set(warm_backoff_key(url), 1, ex=max(1, int(backoff)))
+    website_id = await get_website_id(db, url)
+    if website_id is not None:
+        await touch_website(db, website_id)
+
+
+def scraped_texts(url_info: dict) -> Dict[str, str]:
+    """Extracted text of every scraped page keyed by URL, as saved by save_pages."""
+    return {url_info['url']: url_info['main_page_text'], **(url_info.get('link_texts') or {})}
+
+
+def questions_lock_key(url: str) -> str:
+    """Lock held while a URL's questions are generated."""
+    return f"lock:questions:{cache.normalize_url(url)}"
+
+
+def warm_backoff_key(url: str) -> str:
+    """Set while a URL that failed to refresh is left out of cache warming."""
+    return f"warm:backoff:{cache.normalize_url(url)}"
+
+
 async def get_cached_questions(
     redis_client: async_redis.Redis,
     url: str
 ) -> Optional[List[dict]]:
     """Retrieves cached questions for a given URL."""
-    cached_data = await redis_client.get(f"{url}:questions")
-    return json.loads(cached_data) if cached_data else None
+    return await cache.QUESTIONS.async_get(redis_client, url)
 
 
 async def cache_questions(
@@ -129,7 +520,18 @@ async def cache_questions(
     questions: List[dict]
 ) -> None:
     """Caches questions for a given URL."""
-    await redis_client.set(f"{url}:questions", json.dumps(questions))
+    await cache.QUESTIONS.async_set(redis_client, url, questions)
+
+
+async def cache_links(
+    redis_client: async_redis.Redis,
+    url: str,
+    links: List[str],
+    overwrite: bool = True
+) -> None:
+    """Caches the links shown for a URL, in the same shape the API returns them."""
+    if links:  # Only cache when we see more than the original link
+        await cache.LINKS.async_set(redis_client, url, links + [url], nx=not overwrite)
 
 
 async def publish_questions(
@@ -137,23 +539,16 @@ async def publish_questions(
     redis_client: async_redis.Redis,
     payload: QuestionPayload
 ) -> None:
-    """Publishes questions to the Redis channel."""
-    await redis_client.publish(
-        f'questions:{session_id}',
-        json.dumps(payload.__dict__)
-    )
-    print("published")
+    """Publishes questions to the session's event log."""
+    await publish_event(redis_client, session_id, payload.__dict__)
 
 
 async def publish_completion_status(
     session_id: str,
     redis_client: async_redis.Redis
 ) -> None:
-    """Publishes completion status to the Redis channel."""
-    await redis_client.publish(
-        f'questions:{session_id}',
-        json.dumps({'status': 'complete'})
-    )
+    """Publishes completion status to the session's event log."""
+    await publish_event(redis_client, session_id, {'status': 'complete'})
 
 
 async def publish_error_status(
@@ -161,14 +556,11 @@ async def publish_error_status(
     redis_client: async_redis.Redis,
     error_message: str
 ) -> None:
-    """Publishes error status to the Redis channel."""
-    await redis_client.publish(
-        f'questions:{session_id}',
-        json.dumps({
-            'status': 'error',
-            'error': error_message
-        })
-    )
+    """Publishes error status to the session's event log."""
+    await publish_event(redis_client, session_id, {
+        'status': 'error',
+        'error': error_message
+    })
 
 
 
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+from typing import Awaitable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """
+    Event loop running forever in a daemon thread.
+
+    Flask runs every async view in its own short-lived event loop, so
+    long-lived async resources (browsers, connection pools) live on one of
+    these and work is submitted to it with `run`.
+    """
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    async def run(self, coro: Awaitable[T]) -> T:
+        """Awaits `coro` on the background loop. Safe to call from any event loop."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def run_sync(self, coro: Awaitable[T]) -> T:
+        """Blocks the calling thread until `coro` has run on the background loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import atexit
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+
+from src.utils.background_loop import BackgroundLoop
+
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 4))
+MAX_USES = int(os.getenv("BROWSER_POOL_MAX_USES", 50))
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Slot:
+    """A reusable browser context with its page and usage count"""
+    context: BrowserContext
+    page: Page
+    uses: int = 0
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium browser shared by all screenshot requests.
+
+    The browser lives on a dedicated background loop and jobs are submitted
+    to it with `run`. Each of the `size` slots holds a context and page that are
+    reused until they have served `max_uses` jobs, fail, or the browser dies.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = MAX_USES, **launch_options):
+        self.size = size
+        self.max_uses = max_uses
+        self.launch_options = {'headless': True, **launch_options}
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._started: Optional[asyncio.Future] = None
+        self._background = BackgroundLoop("browser-pool")
+        self._closed = False
+
+    async def run(self, job: Callable[[Page], Awaitable[T]]) -> T:
+        """Runs `job(page)` on a pooled page. Safe to await from any event loop."""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        return await self._background.run(self._run(job))
+
+    def close(self) -> None:
+        """Closes the browser and stops the background loop."""
+        if self._closed:
+            return
+        self._closed = True
+        self._background.run_sync(self._shutdown())
+        self._background.stop()
+
+    async def _run(self, job: Callable[[Page], Awaitable[T]]) -> T:
+        await self._ensure_started()
+        slot = await self._slots.get()
+        try:
+            slot = await self._checkout(slot)
+            try:
+                result = await job(slot.page)
+            except Exception:
+                # Page state is unknown after a failure, don't hand it out again
+                slot = await self._recycle(slot)
+                raise
+            slot.uses += 1
+            if slot.uses >= self.max_uses:
+                slot = await self._recycle(slot)
+            return result
+        finally:
+            self._slots.put_nowait(slot)
+
+    async def _ensure_started(self) -> None:
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        try:
+            await self._started
+        except Exception:
+            # Let the next job retry the launch
+            self._started = None
+            raise
+
+    async def _start(self) -> None:
+        await self._launch()
+        slots = asyncio.Queue()
+        for _ in range(self.size):
+            slots.put_nowait(await self._new_slot())
+        self._browser_lock = asyncio.Lock()
+        self._slots = slots
+
+    async def _launch(self) -> None:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(**self.launch_options)
+        logger.info(f"Launched pooled browser with {self.size} slots")
+
+    async def _new_slot(self) -> _Slot:
+        context = await self._browser.new_context()
+        page = await context.new_page()
+        return _Slot(context=context, page=page)
+
+    async def _checkout(self, slot: _Slot) -> _Slot:
+        """Health check before handing a slot out, relaunching what has died."""
+        async with self._browser_lock:
+            if not self._browser.is_connected():
+                logger.warning("Pooled browser disconnected, relaunching")
+                await self._launch()
+        if not self._browser.is_connected() or slot.page.is_closed() or slot.context.browser is not self._browser:
+            return await self._recycle(slot)
+        return slot
+
+    async def _recycle(self, slot: _Slot) -> _Slot:
+        try:
+            await slot.context.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled context: {str(e)}")
+        return await self._new_slot()
+
+    async def _shutdown(self) -> None:
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.debug(f"Error closing pooled browser: {str(e)}")
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Returns the process-wide browser pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+    return _pool
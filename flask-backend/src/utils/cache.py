@@ -0,0 +1,186 @@
+import os
+import json
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import redis
+import redis.asyncio as async_redis
+
+
+KEY_PREFIX = "cache"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+# Values at least this long are zlib compressed
+COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 512))
+
+_RAW = b'j'
+_COMPRESSED = b'z'
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for cache keys, so `http://X.com` and
+    `https://x.com/` share an entry: the scheme, fragment and default ports
+    are dropped, the host lowercased, trailing slashes removed and the query
+    parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{host}{path}?{query}" if query else f"{host}{path}"
+
+
+def encode(value: Any, compress_min_bytes: int = COMPRESS_MIN_BYTES) -> bytes:
+    payload = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if len(payload) >= compress_min_bytes:
+        return _COMPRESSED + zlib.compress(payload)
+    return _RAW + payload
+
+
+def decode(data: Optional[bytes]) -> Any:
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    marker, payload = data[:1], data[1:]
+    if marker == _COMPRESSED:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class CacheNamespace:
+    """
+    A family of cached values keyed by normalised URL, e.g. every site's
+    questions. Entries expire after `ttl` seconds so memory stays bounded,
+    and lookups and misses are counted for `stats`.
+
+    Like `singleflight`, methods take the Redis client so the same
+    namespace serves the sync client of the Flask app and the async client
+    of the Celery tasks.
+    """
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+
+    def key(self, url: str) -> str:
+        return f"{KEY_PREFIX}:{self.name}:{normalize_url(url)}"
+
+    def get(self, redis_client: redis.Redis, url: str) -> Any:
+        return get_many(redis_client, [(self, url)])[0]
+
+    def set(self, redis_client: redis.Redis, url: str, value: Any, nx: bool = False) -> bool:
+        return bool(redis_client.set(self.key(url), encode(value), ex=self.ttl, nx=nx))
+
+    async def async_get(self, redis_client: async_redis.Redis, url: str) -> Any:
+        return (await async_get_many(redis_client, [(self, url)]))[0]
+
+    async def async_set(self, redis_client: async_redis.Redis, url: str, value: Any, nx: bool = False) -> bool:
+        return bool(await redis_client.set(self.key(url), encode(value), ex=self.ttl, nx=nx))
+
+
+QUESTIONS = CacheNamespace("questions", int(os.getenv("CACHE_TTL_QUESTIONS", 7 * 24 * 3600)))
+LINKS = CacheNamespace("links", int(os.getenv("CACHE_TTL_LINKS", 24 * 3600)))
+IMAGES = CacheNamespace("img", int(os.getenv("CACHE_TTL_IMAGES", 7 * 24 * 3600)))
+NAMESPACES = (QUESTIONS, LINKS, IMAGES)
+
+
+def _count_lookups(pipe, entries: Sequence[Tuple[CacheNamespace, str]]) -> None:
+    for name, count in Counter(namespace.name for namespace, _ in entries).items():
+        pipe.hincrby(STATS_KEY, f"{name}:lookups", count)
+
+
+def _count_misses(pipe, entries: Sequence[Tuple[CacheNamespace, str]], values: List[Optional[bytes]]) -> bool:
+    misses = Counter(namespace.name for (namespace, _), value in zip(entries, values) if value is None)
+    for name, count in misses.items():
+        pipe.hincrby(STATS_KEY, f"{name}:misses", count)
+    return bool(misses)
+
+
+def get_many(
+    redis_client: redis.Redis,
+    entries: Sequence[Tuple[CacheNamespace, str]],
+    record: Optional[Callable[[Any], None]] = None
+) -> List[Any]:
+    """
+    Fetches several (namespace, url) entries, None for misses. `record` may
+    queue more writes on the pipeline, e.g. `popularity.record_request`, so
+    when everything is cached the lookup, its stats and those writes all
+    take one round trip. Misses are counted with a second one.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    if record is not None:
+        record(pipe)
+    _count_lookups(pipe, entries)
+    pipe.mget([namespace.key(url) for namespace, url in entries])
+    values = pipe.execute()[-1]
+    pipe = redis_client.pipeline(transaction=False)
+    if _count_misses(pipe, entries, values):
+        pipe.execute()
+    return [decode(value) for value in values]
+
+
+async def async_get_many(
+    redis_client: async_redis.Redis,
+    entries: Sequence[Tuple[CacheNamespace, str]],
+    record: Optional[Callable[[Any], None]] = None
+) -> List[Any]:
+    """Async version of `get_many`."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if record is not None:
+            record(pipe)
+        _count_lookups(pipe, entries)
+        pipe.mget([namespace.key(url) for namespace, url in entries])
+        values = (await pipe.execute())[-1]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if _count_misses(pipe, entries, values):
+            await pipe.execute()
+    return [decode(value) for value in values]
+
+
+def stats(redis_client: redis.Redis, namespaces: Sequence[CacheNamespace] = NAMESPACES) -> Dict[str, Dict[str, float]]:
+    """
+    Hit/miss counts, hit ratio, live keys and stored bytes per namespace.
+    Keys are counted with SCAN, so this is meant for monitoring rather than
+    the request path.
+    """
+    counts = {
+        (field.decode('utf-8') if isinstance(field, bytes) else field): int(count)
+        for field, count in redis_client.hgetall(STATS_KEY).items()
+    }
+    report = {}
+    for namespace in namespaces:
+        keys, used = 0, 0
+        pattern = f"{KEY_PREFIX}:{namespace.name}:*"
+        for batch in _batched(redis_client.scan_iter(match=pattern, count=500), 500):
+            pipe = redis_client.pipeline(transaction=False)
+            for key in batch:
+                pipe.strlen(key)
+            sizes = pipe.execute()
+            keys += len(sizes)
+            used += sum(sizes)
+        misses = counts.get(f"{namespace.name}:misses", 0)
+        hits = counts.get(f"{namespace.name}:lookups", 0) - misses
+        report[namespace.name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'keys': keys,
+            'bytes': used,
+        }
+    return report
+
+
+def _batched(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
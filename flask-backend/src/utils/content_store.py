@@ -0,0 +1,62 @@
+import os
+import hashlib
+import zlib
+from typing import Dict, Iterator, Mapping
+
+try:
+    import zstandard
+except ImportError:  # Optional, zlib is used when missing
+    zstandard = None
+
+
+# zstd levels up to ~12 still compress page text faster than it downloads
+ZSTD_LEVEL = int(os.getenv("CONTENT_ZSTD_LEVEL", 9))
+
+_ZLIB = b'z'
+_ZSTD = b's'
+
+
+def text_hash(text: str) -> str:
+    """Key of a page text in the content store, shared by identical texts across sites."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress(text: str) -> bytes:
+    """Compress page text with zstd, or zlib when zstandard isn't installed."""
+    data = text.encode('utf-8')
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return _ZLIB + zlib.compress(data, 9)
+
+
+def decompress(data: bytes) -> str:
+    marker, payload = bytes(data[:1]), data[1:]
+    if marker == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Stored page text is zstd compressed, install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    if marker == _ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown content encoding {marker!r}")
+
+
+class LazyTexts(Mapping[str, str]):
+    """
+    Page texts keyed by URL, kept compressed until a page is read. Each
+    text is decompressed at most once.
+    """
+
+    def __init__(self, compressed: Dict[str, bytes]):
+        self._compressed = compressed
+        self._texts: Dict[str, str] = {}
+
+    def __getitem__(self, url: str) -> str:
+        if url not in self._texts:
+            self._texts[url] = decompress(self._compressed[url])
+        return self._texts[url]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._compressed)
+
+    def __len__(self) -> int:
+        return len(self._compressed)
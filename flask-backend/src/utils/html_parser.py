@@ -0,0 +1,161 @@
+import os
+import re
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+
+PARSER_BACKEND = os.getenv("SCRAPER_PARSER", "lxml")
+PARSE_WORKERS = int(os.getenv("SCRAPER_PARSE_WORKERS", 4))
+# Pages smaller than this are parsed inline, shipping them to a worker costs more
+OFFLOAD_BYTES = int(os.getenv("SCRAPER_PARSE_OFFLOAD_BYTES", 64 * 1024))
+
+REMOVED_TAGS = ('script', 'style', 'footer', 'header')
+REMOVED_CLASS = 'menu'
+# Subpages only keep text found inside these tags
+CONTENT_TAGS = ('p', 'article', 'section', 'div', 'nav')
+
+ParseResult = Tuple[str, Set[str]]
+
+
+def clean_text(text: str) -> str:
+    """Collapses whitespace runs into single spaces."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _parse_html_parser(html: str, base_url: str, parse_links: bool) -> ParseResult:
+    """BeautifulSoup with the pure-Python html.parser, no extra dependencies."""
+    links = set()
+    # Only parse links if needed (main page)
+    parse_only = None if parse_links else SoupStrainer(list(CONTENT_TAGS))
+    soup = BeautifulSoup(html, 'html.parser', parse_only=parse_only)
+
+    # Remove unwanted elements
+    for element in soup.select(f'{", ".join(REMOVED_TAGS)}, [class*="{REMOVED_CLASS}"]'):
+        element.decompose()
+
+    if parse_links:
+        for link in soup.find_all('a', href=True):
+            links.add(urljoin(base_url, link['href']))
+
+    return clean_text(soup.get_text()), links
+
+
+def _parse_lxml(html: str, base_url: str, parse_links: bool) -> ParseResult:
+    """libxml2 through lxml.html."""
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    if not html.strip():
+        return "", set()
+    # Pass bytes so documents with an XML encoding declaration are accepted
+    root = lxml_html.document_fromstring(html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+    etree.strip_elements(root, etree.Comment, *REMOVED_TAGS, with_tail=False)
+    for element in root.xpath(f'//*[contains(@class, "{REMOVED_CLASS}")][parent::*]'):
+        element.drop_tree()
+
+    links = set()
+    if parse_links:
+        links = {urljoin(base_url, href) for href in root.xpath('//a/@href')}
+        text = root.text_content()
+    else:
+        content = ' or '.join(f'self::{tag}' for tag in CONTENT_TAGS)
+        outermost = root.xpath(f'//*[{content}][not(ancestor::*[{content}])]')
+        text = ' '.join(element.text_content() for element in outermost)
+
+    return clean_text(text), links
+
+
+def _parse_selectolax(html: str, base_url: str, parse_links: bool) -> ParseResult:
+    """Lexbor through selectolax."""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(REMOVED_TAGS))
+    for node in tree.css(f'[class*="{REMOVED_CLASS}"]'):
+        node.decompose()
+
+    links = set()
+    if parse_links:
+        links = {urljoin(base_url, node.attributes['href'] or '') for node in tree.css('a[href]')}
+        text = tree.root.text(separator=' ') if tree.root else ""
+    else:
+        parts = []
+        for node in tree.css(', '.join(CONTENT_TAGS)):
+            parent, nested = node.parent, False
+            while parent is not None and not nested:
+                nested = parent.tag in CONTENT_TAGS
+                parent = parent.parent
+            if not nested:
+                parts.append(node.text(separator=' '))
+        text = ' '.join(parts)
+
+    return clean_text(text), links
+
+
+PARSERS: Dict[str, Callable[[str, str, bool], ParseResult]] = {
+    'html.parser': _parse_html_parser,
+    'lxml': _parse_lxml,
+    'selectolax': _parse_selectolax,
+}
+
+
+def parse_html(html: str, base_url: str, parse_links: bool = False, backend: str = PARSER_BACKEND) -> ParseResult:
+    """
+    Extracts the visible text of a page and, when `parse_links` is set, the
+    absolute URLs of its links, in a single parse. Scripts, styles, headers,
+    footers and menus are dropped. Subpages only keep text inside content
+    tags, matching what the scraper has always collected.
+    """
+    try:
+        parse = PARSERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return parse(html, base_url, parse_links)
+
+
+_parse_executor: Optional[Executor] = None
+
+
+def process_context() -> multiprocessing.context.BaseContext:
+    """Start method for worker pools that never forks a running process."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_parse_executor() -> Executor:
+    """
+    Worker pool for parsing large pages. Parsing is CPU bound so a process
+    pool is used, except inside daemonic processes (Celery prefork children)
+    that aren't allowed to start their own, where it falls back to threads.
+    
+    Workers are started from a fork server (or spawned where there is none)
+    rather than forked from this process, whose background threads may hold
+    locks that a forked child would inherit locked.
+    """
+    global _parse_executor
+    if _parse_executor is None:
+        if multiprocessing.current_process().daemon:
+            _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="html-parse")
+        else:
+            _parse_executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=process_context())
+    return _parse_executor
+
+
+async def async_parse_html(
+    html: str,
+    base_url: str,
+    parse_links: bool = False,
+    backend: str = PARSER_BACKEND,
+    offload_bytes: int = OFFLOAD_BYTES
+) -> ParseResult:
+    """`parse_html` that runs pages over `offload_bytes` on the parse pool so the event loop keeps serving."""
+    if len(html) < offload_bytes:
+        return parse_html(html, base_url, parse_links, backend)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_executor(), parse_html, html, base_url, parse_links, backend)
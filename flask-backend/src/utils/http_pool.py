@@ -0,0 +1,195 @@
+import os
+import socket
+import asyncio
+import atexit
+import logging
+import ipaddress
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import httpcore
+import httpx
+
+from src.utils.background_loop import BackgroundLoop
+
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", 50))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", 30))
+PER_HOST_LIMIT = int(os.getenv("HTTP_POOL_PER_HOST", 10))
+DNS_TTL = float(os.getenv("HTTP_POOL_DNS_TTL", 300))
+HTTP2 = os.getenv("HTTP_POOL_HTTP2", "true").lower() == "true"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+T = TypeVar("T")
+
+
+class CachingResolver(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that caches DNS lookups for `ttl` seconds, so repeated
+    connections to the same hosts skip the resolver. Addresses are tried in
+    order and a host's entry is dropped when none of them connect.
+    """
+
+    def __init__(self, ttl: float = DNS_TTL, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        with self._lock:
+            cached = self._cache.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        self.lookups += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host: str, port: int) -> None:
+        with self._lock:
+            self._cache.pop((host, port), None)
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        error: Optional[Exception] = None
+        for address in await self.resolve(host, port):
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        self.forget(host, port)
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class _PooledTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport whose connection pool resolves hosts through a shared CachingResolver."""
+
+    def __init__(self, limits: httpx.Limits, http2: bool, resolver: CachingResolver):
+        super().__init__(limits=limits, http2=http2)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=resolver,
+        )
+
+
+class HttpClientPool:
+    """
+    Process-wide HTTP client shared by all WebsiteScraper instances.
+
+    Connections (with HTTP/2 where the server supports it) are kept alive
+    between scrapes instead of every scraper paying fresh DNS, TCP and TLS
+    setup. Because connections belong to the event loop that opened them,
+    the client lives on a background loop and scrapes run there via `run`.
+    `host_slot` caps the requests in flight to any single host.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        per_host_limit: int = PER_HOST_LIMIT,
+        http2: bool = HTTP2,
+        dns_ttl: float = DNS_TTL
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self.per_host_limit = per_host_limit
+        self.http2 = http2
+        self.resolver = CachingResolver(ttl=dns_ttl)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Semaphore and number of holders plus waiters of each busy host
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self._background = BackgroundLoop("http-pool")
+
+    async def run(self, coro: Awaitable[T]) -> T:
+        """Runs `coro` on the pool's event loop, where `client` may be used."""
+        return await self._background.run(coro)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client. Only usable from coroutines started with `run`."""
+        if asyncio.get_running_loop() is not self._background.loop:
+            raise RuntimeError("The pooled HTTP client can only be used inside HttpClientPool.run")
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=_PooledTransport(self.limits, self.http2, self.resolver),
+                follow_redirects=True,
+                headers=DEFAULT_HEADERS,
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def host_slot(self, url: str):
+        """
+        Holds one of the `per_host_limit` request slots for the URL's host.
+        A host's semaphore is dropped once nobody holds or waits for it, so
+        crawling many sites doesn't keep one around for every host seen.
+        """
+        host = urlparse(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host]
+                del self._host_limits[host]
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._background.run_sync(self._client.aclose())
+            self._client = None
+        self._background.stop()
+
+
+_pool: Optional[HttpClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpClientPool:
+    """Returns the process-wide HTTP client pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HttpClientPool()
+            atexit.register(_pool.close)
+    return _pool
@@ -0,0 +1,73 @@
+import json
+from typing import Any, List
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array arriving in chunks, e.g. from a
+    streamed LLM completion. `feed` returns the elements completed by each
+    chunk, so they can be used before the rest of the array arrives.
+
+    Only the nesting of brackets and strings is tracked; every completed
+    element is parsed with `json.loads`. Text before the opening bracket,
+    such as a markdown code fence, is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # Next character of the buffer to scan
+        self._start = None  # Where the element being scanned starts
+        self._depth = 0  # 0 before the array, 1 between its elements
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        self._buffer += chunk
+        items = []
+        while self._pos < len(self._buffer) and not self.done:
+            char = self._buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == '[':
+                    self._depth = 1
+            elif char in '[{':
+                if self._depth == 1:
+                    self._start = self._pos
+                self._depth += 1
+            elif char in ']}':
+                if self._depth == 1:  # End of the array
+                    if self._start is not None:
+                        items.append(json.loads(self._buffer[self._start:self._pos]))
+                        self._start = None
+                    self._depth = 0
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 1:
+                        items.append(json.loads(self._buffer[self._start:self._pos + 1]))
+                        self._start = None
+            elif char == '"':
+                if self._depth == 1:
+                    self._start = self._pos
+                self._in_string = True
+            elif self._depth == 1 and self._start is not None and char == ',':
+                items.append(json.loads(self._buffer[self._start:self._pos]))
+                self._start = None
+            elif self._depth == 1 and self._start is None and not char.isspace() and char != ',':
+                self._start = self._pos  # A number, true, false or null
+            self._pos += 1
+
+        # Keep only the unfinished element around
+        keep = self._start if self._start is not None else self._pos
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._start is not None:
+            self._start = 0
+        return items
@@ -1,19 +1,46 @@
 import os
 import json
-from typing import Tuple, List, Optional
+import time
+import random
+import asyncio
+import logging
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Tuple, List, Optional
 from rake_nltk import Rake
 import google.generativeai as genai
 from dotenv import load_dotenv
 from openai import OpenAI
+import httpx
 import requests
 from typing_extensions import TypedDict
 
+from src.utils.html_parser import process_context
+from src.utils.json_stream import JsonArrayStream
+from src.utils.llm_cache import LLMCache, content_hash
+from src.utils.prompt_budget import (
+    KEYWORD_BUDGET_SHARE, PROMPT_TOKEN_BUDGET, estimate_tokens, fit_keywords, fit_text, strip_boilerplate
+)
+
 
 
 load_dotenv()  # take environment variables from .env.
 
 genai.configure(api_key=os.getenv("GEMINI_KEY", ""))
 ARLIAI_API_KEY = os.getenv("ARLIAI_API_KEY")
+ARLIAI_URL = "https://api.arliai.com/v1/chat/completions"
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", 1))
+KEYWORD_WORKERS = int(os.getenv("KEYWORD_WORKERS", os.cpu_count() or 1))
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+RANKING_PHRASES = 100  # main page phrases used to rank sentences for the prompt
+
+logger = logging.getLogger(__name__)
 
 class Analysis(TypedDict):
     topics: list[str]
@@ -54,21 +81,175 @@ class UrlInfo(TypedDict):
     link_texts: dict[str, str]
 
 
+_rake_local = threading.local()
+
+
+def _get_rake() -> Rake:
+    # Rake keeps the state of the last extraction on itself, so threads can't share one
+    rake = getattr(_rake_local, 'rake', None)
+    if rake is None:
+        rake = _rake_local.rake = Rake(include_repeated_phrases=False)
+    return rake
+
+
+def rake_keywords(text: str, num_keywords: int) -> List[Tuple[str, float]]:
+    """Module-level RAKE extraction so it can run in a worker process."""
+    rake = _get_rake()
+    rake.extract_keywords_from_text(text)
+    keywords = rake.get_ranked_phrases_with_scores()
+    return [(keyword, score) for score, keyword in keywords[: num_keywords]]
+
+
+_keyword_executor: Optional[Executor] = None
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_keyword_executor() -> Executor:
+    """
+    Worker pool for keyword extraction. RAKE is CPU bound so a process pool
+    is used, except inside daemonic processes (Celery prefork children) that
+    aren't allowed to start their own, where it falls back to threads.
+    Workers are never forked, see `html_parser.get_parse_executor`.
+    """
+    global _keyword_executor
+    if _keyword_executor is None:
+        if multiprocessing.current_process().daemon:
+            _keyword_executor = ThreadPoolExecutor(max_workers=KEYWORD_WORKERS, thread_name_prefix="rake")
+        else:
+            _keyword_executor = ProcessPoolExecutor(max_workers=KEYWORD_WORKERS, mp_context=process_context())
+    return _keyword_executor
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Pooled HTTP client for LLM calls. Connections belong to the event loop
+    they were opened on, so one client is kept per loop: in a worker process
+    every task runs on the shared loop of `run_in_worker_loop` and reuses
+    its client, other callers (tests, scripts) get their own.
+    """
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
+        )
+        _http_clients[loop] = client
+    return client
+
+
+async def post_with_retries(
+    client: httpx.AsyncClient,
+    url: str,
+    max_retries: int = LLM_MAX_RETRIES,
+    backoff: float = LLM_BACKOFF,
+    **kwargs
+) -> httpx.Response:
+    """POSTs to `url`, retrying transport errors and retryable statuses with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.post(url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                response.raise_for_status()
+                return response
+            logger.warning(f"POST {url} returned {response.status_code}, retrying")
+        except httpx.TransportError as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(f"POST {url} failed ({str(e)}), retrying")
+        await asyncio.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+
+async def stream_json_array(
+    client: httpx.AsyncClient,
+    url: str,
+    on_item: Callable[[Any], Awaitable[None]],
+    max_retries: int = LLM_MAX_RETRIES,
+    backoff: float = LLM_BACKOFF,
+    **kwargs
+) -> List[Any]:
+    """
+    POSTs a streaming (SSE) chat completion whose content is a JSON array,
+    awaiting `on_item` with every element as soon as it is complete.
+    Servers that ignore `stream` and send the whole completion work too.
+    
+    Retries like `post_with_retries` until the first element was handed
+    out, after that a failure is raised so no element is repeated.
+    
+    Returns:
+        Every element of the array
+    """
+    for attempt in range(max_retries + 1):
+        items = []
+        try:
+            async with client.stream('POST', url, **kwargs) as response:
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    response.raise_for_status()
+                    parser = JsonArrayStream()
+                    if response.headers.get('content-type', '').startswith('text/event-stream'):
+                        async for line in response.aiter_lines():
+                            if not line.startswith('data:'):
+                                continue
+                            data = line[len('data:'):].strip()
+                            if data == '[DONE]':
+                                break
+                            delta = json.loads(data)['choices'][0].get('delta') or {}
+                            for item in parser.feed(delta.get('content') or ''):
+                                items.append(item)
+                                await on_item(item)
+                    else:
+                        await response.aread()
+                        content = response.json()['choices'][0]['message']['content']
+                        if isinstance(content, str):
+                            complete = parser.feed(content)
+                        else:
+                            complete, parser.done = content, True
+                        for item in complete:
+                            items.append(item)
+                            await on_item(item)
+                    if not parser.done:
+                        raise ValueError(f"Completion from {url} ended before its JSON array")
+                    return items
+                logger.warning(f"POST {url} returned {response.status_code}, retrying")
+        except httpx.TransportError as e:
+            if attempt == max_retries or items:
+                raise
+            logger.warning(f"POST {url} failed ({str(e)}), retrying")
+        await asyncio.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+
 class QuestionGenerator:
     
-    def __init__(self, url_info: UrlInfo):
+    def __init__(self, url_info: UrlInfo, cache: Optional[LLMCache] = None, token_budget: int = PROMPT_TOKEN_BUDGET):
         self.rake = Rake(include_repeated_phrases=False)
         self.model = genai.GenerativeModel("gemini-1.5-pro")
         self.url_info = url_info
+        self.cache = cache
+        self.token_budget = token_budget
+        self.timings: Dict[str, float] = {}
+        self.prompt_tokens: Dict[str, int] = {}
+        # Menus, footers and banners repeated across pages only waste prompt tokens
+        self.main_text, self.link_texts = strip_boilerplate(url_info['main_page_text'], url_info['link_texts'])
+        self.ranking_phrases: List[Tuple[str, float]] = []
+    
+    @contextmanager
+    def _timed(self, stage: str):
+        """Records how long a pipeline stage took in `self.timings`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+            logger.info(f"{self.url_info['url']} {stage} took {self.timings[stage]:.2f}s")
         
     def extract_all_keywords(self):
-        main_page_keywords = self._extract_keywords(self.url_info['main_page_text'], num_keywords=10)
+        self.ranking_phrases = self._extract_keywords(self.main_text, num_keywords=RANKING_PHRASES)
         sublink_keywords = {
             link: self._extract_keywords(text, num_keywords=5) 
-            for link, text in self.url_info['link_texts'].items()
+            for link, text in self.link_texts.items()
         }
         keywords = {
-            'main_page_keywords': main_page_keywords,
+            'main_page_keywords': self.ranking_phrases[:10],
             'sublink_keywords': sublink_keywords
         }
         return keywords
@@ -84,32 +265,55 @@ class QuestionGenerator:
         keywords = self.rake.get_ranked_phrases_with_scores()
         return [(keyword, score) for score, keyword in keywords[: num_keywords]]
     
-    def _get_text_analysis(self, keywords: dict) -> Analysis:
-        prompt = f"""
+    async def async_extract_all_keywords(self):
+        """Runs RAKE for the main page and every sublink concurrently in the keyword worker pool."""
+        loop = asyncio.get_running_loop()
+        executor = get_keyword_executor()
+        links = list(self.link_texts)
+        results = await asyncio.gather(
+            loop.run_in_executor(executor, rake_keywords, self.main_text, RANKING_PHRASES),
+            *[
+                loop.run_in_executor(executor, rake_keywords, self.link_texts[link], 5)
+                for link in links
+            ]
+        )
+        self.ranking_phrases = results[0]
+        return {
+            'main_page_keywords': results[0][:10],
+            'sublink_keywords': dict(zip(links, results[1:]))
+        }
+    
+    def _analysis_prompt(self, keywords: dict) -> str:
+        """
+        Builds the analysis prompt within `token_budget`: keywords get a fixed
+        share, and the main text is cut down to its highest RAKE-scoring
+        sentences to fill the rest.
+        """
+        template = """
             Analyze this website main content and its sublinks with their keywords and identify the main topics, industry, and target audience
-            main content: {self.url_info['main_page_text']}
+            main content: {main_text}
             keywords: {keywords}
         """
-        result = self.model.generate_content(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json", response_schema=Analysis
-            ),
-        )
-        return json.loads(result.text)
-        
-    def generate_questions(self):
-        keywords = self.extract_all_keywords()
-        analysis = self._get_text_analysis(keywords)
-        print(analysis)
+        keywords = fit_keywords(keywords, int(self.token_budget * KEYWORD_BUDGET_SHARE))
+        text_budget = self.token_budget - estimate_tokens(template) - estimate_tokens(str(keywords))
+        main_text = fit_text(self.main_text, self.ranking_phrases, max(text_budget, 0))
+        prompt = template.format(main_text=main_text, keywords=keywords)
+        self._record_prompt('analysis', prompt)
+        return prompt
+    
+    def _record_prompt(self, stage: str, prompt: str) -> None:
+        self.prompt_tokens[stage] = estimate_tokens(prompt)
+        logger.info(f"{self.url_info['url']} {stage} prompt ~{self.prompt_tokens[stage]} tokens")
+    
+    def _questions_payload(self, analysis: Analysis, keywords: dict) -> dict:
+        sublink_keywords = fit_keywords(keywords, self.token_budget)['sublink_keywords']
         prompt = f"""
             Based on this website analysis: {analysis}
-            and its sublink keywords: {keywords['sublink_keywords']}
+            and its sublink keywords: {sublink_keywords}
             Generate FOUR (4) multiple choice questions that would help categorize visitors:
         """
-        url = "https://api.arliai.com/v1/chat/completions"
-
-        payload = json.dumps({
+        self._record_prompt('questions', prompt)
+        return {
             "model": "Mistral-Nemo-12B-Instruct-2407",
             "messages": [{
             "role": "system",
@@ -123,26 +327,122 @@ class QuestionGenerator:
             "top_p": 0.9,
             "top_k": 40,
             "guided_json": json_schema,
-        })
-        headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f"Bearer {ARLIAI_API_KEY}"
         }
-
-        response = requests.request("POST", url, headers=headers, data=payload)
-        res =  response.json()
-        print(res)
+    
+    @staticmethod
+    def _parse_questions(res: dict) -> List[Question]:
         questions = res["choices"][0]['message']['content']
         if (isinstance(questions, str)):
             questions = json.loads(questions)
         return questions
     
-        """result = self.model.generate_content(
-            prompt,
+    def _get_text_analysis(self, keywords: dict) -> Analysis:
+        result = self.model.generate_content(
+            self._analysis_prompt(keywords),
+            generation_config=genai.GenerationConfig(
+                response_mime_type="application/json", response_schema=Analysis
+            ),
+        )
+        return json.loads(result.text)
+    
+    async def _async_get_text_analysis(self, keywords: dict) -> Analysis:
+        result = await self.model.generate_content_async(
+            self._analysis_prompt(keywords),
             generation_config=genai.GenerationConfig(
-                response_mime_type="application/json", response_schema=list[Question],
+                response_mime_type="application/json", response_schema=Analysis
             ),
+            request_options={'timeout': LLM_TIMEOUT},
         )
-        print(result)
-        return json.loads(result.text)"""
-        
\ No newline at end of file
+        return json.loads(result.text)
+    
+    async def _async_get_questions(self, analysis: Analysis, keywords: dict) -> List[Question]:
+        response = await post_with_retries(
+            get_http_client(),
+            ARLIAI_URL,
+            headers={'Authorization': f"Bearer {ARLIAI_API_KEY}"},
+            json=self._questions_payload(analysis, keywords),
+        )
+        return self._parse_questions(response.json())
+    
+    async def _async_stream_questions(
+        self,
+        analysis: Analysis,
+        keywords: dict,
+        on_question: Callable[[Question], Awaitable[None]]
+    ) -> List[Question]:
+        return await stream_json_array(
+            get_http_client(),
+            ARLIAI_URL,
+            on_question,
+            headers={'Authorization': f"Bearer {ARLIAI_API_KEY}"},
+            json={**self._questions_payload(analysis, keywords), 'stream': True},
+        )
+        
+    def generate_questions(self):
+        keywords = self.extract_all_keywords()
+        analysis = self._get_text_analysis(keywords)
+        print(analysis)
+        payload = json.dumps(self._questions_payload(analysis, keywords))
+        headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f"Bearer {ARLIAI_API_KEY}"
+        }
+
+        response = requests.request("POST", ARLIAI_URL, headers=headers, data=payload)
+        res =  response.json()
+        print(res)
+        return self._parse_questions(res)
+    
+    async def async_generate_questions(
+        self,
+        on_question: Optional[Callable[[Question], Awaitable[None]]] = None
+    ) -> List[Question]:
+        """
+        Non-blocking version of `generate_questions`. Keyword extraction runs
+        in a worker pool and both LLM calls use async clients with timeouts
+        and retries. When a cache is given, both LLM responses are looked up
+        by a hash of the page texts and keywords first. Stage durations are
+        kept in `self.timings`. Raises ValueError when there is no main page
+        text to ask about.
+        
+        With `on_question`, the questions completion is streamed and
+        `on_question` awaited with each question as soon as the LLM has
+        finished writing it (or with every cached question on a cache hit).
+        The time until the first one is kept as `first_question`.
+        """
+        main_page_text = self.url_info['main_page_text']
+        if not main_page_text:
+            # Every failed scrape would hash alike and be served one cached answer
+            raise ValueError(f"No main page text to generate questions for {self.url_info['url']}")
+        
+        started = time.perf_counter()
+        emitted = 0
+        
+        async def emit(question: Question) -> None:
+            nonlocal emitted
+            if emitted == 0:
+                self.timings['first_question'] = time.perf_counter() - started
+            emitted += 1
+            await on_question(question)
+        
+        with self._timed('total'):
+            with self._timed('keywords'):
+                keywords = await self.async_extract_all_keywords()
+            # Linked page texts too, so sites whose main pages look alike don't share entries
+            digest = content_hash(main_page_text, sorted(self.url_info['link_texts'].values()), keywords)
+            with self._timed('analysis'):
+                analysis = await self._cached('analysis', digest, lambda: self._async_get_text_analysis(keywords))
+            with self._timed('questions'):
+                if on_question is None:
+                    questions = await self._cached('questions', digest, lambda: self._async_get_questions(analysis, keywords))
+                else:
+                    questions = await self._cached('questions', digest, lambda: self._async_stream_questions(analysis, keywords, emit))
+                    for question in questions[emitted:]:
+                        await emit(question)
+        return questions
+    
+    async def _cached(self, stage: str, digest: str, compute):
+        if self.cache is None:
+            return await compute()
+        return await self.cache.get_or_compute(stage, digest, compute)
+        
@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as async_redis
+
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000))
+
+
+def _normalise(value: Any) -> Any:
+    """Lowercases and collapses whitespace in strings so cosmetic differences share an entry."""
+    if isinstance(value, str):
+        return re.sub(r'\s+', ' ', value).strip().lower()
+    if isinstance(value, dict):
+        return {str(k): _normalise(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def content_hash(*inputs: Any) -> str:
+    """Stable hash of the normalised prompt inputs."""
+    payload = json.dumps(_normalise(list(inputs)), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Redis cache for LLM responses keyed on a hash of the prompt inputs rather
+    than the URL, so mirrored or redeployed sites with the same content share
+    entries and changed content misses.
+
+    Entries expire after `ttl` seconds. A sorted set of last-access times
+    bounds the cache to `max_entries`, evicting the least recently used.
+    Hits and misses are counted per stage in a hash.
+    """
+
+    def __init__(
+        self,
+        redis_client: async_redis.Redis,
+        namespace: str = "llm",
+        ttl: int = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES
+    ):
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lru_key = f"{namespace}:lru"
+        self.stats_key = f"{namespace}:stats"
+
+    def key(self, stage: str, digest: str) -> str:
+        return f"{self.namespace}:{stage}:{digest}"
+
+    async def get(self, stage: str, digest: str) -> Optional[Any]:
+        key = self.key(stage, digest)
+        value = await self.redis_client.get(key)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            if value is None:
+                pipe.zrem(self.lru_key, key)
+                pipe.hincrby(self.stats_key, f"{stage}:misses", 1)
+            else:
+                pipe.zadd(self.lru_key, {key: time.time()})
+                pipe.hincrby(self.stats_key, f"{stage}:hits", 1)
+            await pipe.execute()
+        return json.loads(value) if value is not None else None
+
+    async def set(self, stage: str, digest: str, value: Any) -> None:
+        key = self.key(stage, digest)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(value), ex=self.ttl)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.zcard(self.lru_key)
+            *_, size = await pipe.execute()
+        if size > self.max_entries:
+            await self._evict(size - self.max_entries)
+
+    async def get_or_compute(
+        self,
+        stage: str,
+        digest: str,
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Returns the cached response for `stage`, computing and storing it on a miss."""
+        cached = await self.get(stage, digest)
+        if cached is not None:
+            logger.info(f"LLM cache hit for {stage}")
+            return cached
+        value = await compute()
+        if value:
+            await self.set(stage, digest, value)
+        return value
+
+    async def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counts and hit ratio per stage, plus the number of tracked entries."""
+        raw = await self.redis_client.hgetall(self.stats_key)
+        stats: Dict[str, Dict[str, float]] = {}
+        for field, count in raw.items():
+            field = field.decode('utf-8') if isinstance(field, bytes) else field
+            stage, _, kind = field.rpartition(':')
+            stats.setdefault(stage, {'hits': 0, 'misses': 0})[kind] = int(count)
+        for stage_stats in stats.values():
+            total = stage_stats['hits'] + stage_stats['misses']
+            stage_stats['hit_ratio'] = stage_stats['hits'] / total if total else 0.0
+        stats['entries'] = {'count': await self.redis_client.zcard(self.lru_key)}
+        return stats
+
+    async def _evict(self, count: int) -> None:
+        evicted = await self.redis_client.zpopmin(self.lru_key, count)
+        keys = [key for key, _ in evicted]
+        if keys:
+            await self.redis_client.delete(*keys)
+            logger.info(f"Evicted {len(keys)} LLM cache entries")
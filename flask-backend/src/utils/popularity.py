@@ -0,0 +1,36 @@
+import os
+from typing import List, Optional, Tuple
+
+import redis
+import redis.asyncio as async_redis
+
+
+POPULARITY_KEY = "websites:requests"
+# Scores are multiplied by this on every warm run, so old traffic fades out
+POPULARITY_DECAY = float(os.getenv("POPULARITY_DECAY", 0.5))
+
+
+def record_request(redis_client: redis.Redis, url: str) -> None:
+    """Counts a request for `url` towards its warming priority. Also takes a pipeline."""
+    redis_client.zincrby(POPULARITY_KEY, 1, url)
+
+
+async def hottest(redis_client: async_redis.Redis, limit: int) -> List[Tuple[str, float]]:
+    """The `limit` most requested URLs with their decayed request counts, busiest first."""
+    entries = await redis_client.zrevrange(POPULARITY_KEY, 0, limit - 1, withscores=True)
+    return [(url.decode('utf-8') if isinstance(url, bytes) else url, score) for url, score in entries]
+
+
+async def scores(redis_client: async_redis.Redis, urls: List[str]) -> List[Optional[float]]:
+    """Decayed request counts of `urls`, None for URLs never requested."""
+    if not urls:
+        return []
+    return await redis_client.zmscore(POPULARITY_KEY, urls)
+
+
+async def decay(redis_client: async_redis.Redis, factor: float = POPULARITY_DECAY) -> None:
+    """Scales every score by `factor` and drops URLs that have faded below a tenth of a request."""
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.zunionstore(POPULARITY_KEY, {POPULARITY_KEY: factor})
+        pipe.zremrangebyscore(POPULARITY_KEY, '-inf', '(0.1')
+        await pipe.execute()
@@ -0,0 +1,131 @@
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+# Share of the budget given to the keywords, the rest goes to page text
+KEYWORD_BUDGET_SHARE = float(os.getenv("PROMPT_KEYWORD_SHARE", 0.3))
+CHARS_PER_TOKEN = 4
+MAX_SEGMENT_CHARS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text). Close
+    enough for budgeting without a tokenizer round trip to the provider.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_segments(text: str, max_chars: int = MAX_SEGMENT_CHARS) -> List[str]:
+    """
+    Splits scraped text into sentences. Scraped navigation and lists often
+    have no punctuation, so long runs are cut into chunks of `max_chars`.
+    """
+    segments = []
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            segments.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            segments.append(sentence)
+    return segments
+
+
+def _segment_key(segment: str) -> str:
+    return re.sub(r'\W+', ' ', segment).strip().lower()
+
+
+def strip_boilerplate(
+    main_text: str,
+    link_texts: Dict[str, str],
+    min_pages: int = 2
+) -> Tuple[str, Dict[str, str]]:
+    """
+    Removes segments repeated on `min_pages` or more pages (menus, cookie
+    banners, footers), keeping the first occurrence on the main page.
+    """
+    pages = [main_text, *link_texts.values()]
+    if len(pages) < 2:
+        return main_text, dict(link_texts)
+
+    seen_on = Counter()
+    for page in pages:
+        seen_on.update({_segment_key(segment) for segment in split_segments(page)})
+    boilerplate = {key for key, count in seen_on.items() if key and count >= min_pages}
+
+    def strip(text: str, keep_first: bool) -> str:
+        kept, emitted = [], set()
+        for segment in split_segments(text):
+            key = _segment_key(segment)
+            if key in boilerplate and (not keep_first or key in emitted):
+                continue
+            emitted.add(key)
+            kept.append(segment)
+        return ' '.join(kept)
+
+    return strip(main_text, keep_first=True), {
+        link: strip(text, keep_first=False) for link, text in link_texts.items()
+    }
+
+
+def fit_text(
+    text: str,
+    phrase_scores: Sequence[Tuple[str, float]],
+    budget: int
+) -> str:
+    """
+    Keeps the highest scoring segments of `text` that fit in `budget` tokens,
+    in their original order. A segment scores the sum of the RAKE scores of
+    the key phrases it contains.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+
+    segments = split_segments(text)
+    phrases = [(phrase.lower(), score) for phrase, score in phrase_scores]
+    scores = [
+        sum(score for phrase, score in phrases if phrase in segment.lower())
+        for segment in segments
+    ]
+    ranked = sorted(range(len(segments)), key=lambda i: (-scores[i], i))
+
+    chosen, used = set(), 0
+    for i in ranked:
+        cost = estimate_tokens(segments[i]) + 1
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+    return ' '.join(segments[i] for i in sorted(chosen))
+
+
+def fit_keywords(keywords: dict, budget: int) -> dict:
+    """
+    Trims the keyword dict to `budget` tokens by dropping the lowest scoring
+    sublink keywords first. Main page keywords are kept.
+    """
+    if estimate_tokens(str(keywords)) <= budget:
+        return keywords
+
+    sublink_keywords = keywords.get('sublink_keywords', {})
+    entries = sorted(
+        ((score, link, phrase) for link, pairs in sublink_keywords.items() for phrase, score in pairs),
+        reverse=True
+    )
+    trimmed = {
+        'main_page_keywords': keywords.get('main_page_keywords', []),
+        'sublink_keywords': {},
+    }
+    for score, link, phrase in entries:
+        trimmed['sublink_keywords'].setdefault(link, []).append((phrase, score))
+        if estimate_tokens(str(trimmed)) > budget:
+            trimmed['sublink_keywords'][link].pop()
+            if not trimmed['sublink_keywords'][link]:
+                del trimmed['sublink_keywords'][link]
+            break
+    return trimmed
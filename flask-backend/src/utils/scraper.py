@@ -1,23 +1,41 @@
+import os
 import time
+import hashlib
 import random
 import httpx
-from bs4 import BeautifulSoup
 import asyncio
-from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup, SoupStrainer
 import httpx
 import asyncio
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from typing import Set, Dict, Optional
 import logging
 from functools import lru_cache
-import re
-import json_fix
+
+from src.utils.html_parser import PARSER_BACKEND, async_parse_html, clean_text
+from src.utils.http_pool import HttpClientPool, get_http_pool
+
+SCRAPE_TIME_BUDGET = float(os.getenv("SCRAPE_TIME_BUDGET", 25))
+MAX_PAGE_BYTES = int(os.getenv("SCRAPER_MAX_PAGE_BYTES", 2 * 1024 * 1024))
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class PageRejected(Exception):
+    """Raised when a response is not something the scraper should parse."""
 
 
 class WebsiteScraper:
-    def __init__(self, url: str, max_concurrent: int = 10, timeout: int = 30):
+    def __init__(
+        self,
+        url: str,
+        max_concurrent: int = 10,
+        timeout: int = 30,
+        http_pool: Optional[HttpClientPool] = None,
+        page_timeout: Optional[float] = None,
+        time_budget: float = SCRAPE_TIME_BUDGET,
+        parser: str = PARSER_BACKEND,
+        max_page_bytes: int = MAX_PAGE_BYTES
+    ):
         """
         Initialize the scraper with configurable parameters.
         
@@ -25,16 +43,30 @@ class WebsiteScraper:
             url: Base URL to scrape
             max_concurrent: Maximum number of concurrent requests
             timeout: Request timeout in seconds
+            http_pool: Pool to borrow the HTTP client from, defaults to the process-wide one
+            page_timeout: Deadline for fetching and parsing one page, defaults to `timeout`
+            time_budget: Overall seconds for `scrape_all`, pages still in flight are dropped
+            parser: HTML parser backend, see `html_parser.PARSERS`
+            max_page_bytes: Bytes downloaded per page, longer pages are cut off
         """
         self.url = url
         self.base_domain = urlparse(url).netloc
         self.home_page_text = ""
         self.links: Set[str] = set()
         self.link_texts: Dict[str, str] = {}
+        # Validators (etag, last_modified, content_hash) of every page downloaded
+        self.pages: Dict[str, dict] = {}
         self.max_concurrent = max_concurrent
         self.semaphore = asyncio.Semaphore(max_concurrent)
         self.timeout = timeout
+        self.page_timeout = page_timeout or timeout
+        self.time_budget = time_budget
+        self.budget_exhausted = False
+        self._deadline: Optional[float] = None
+        self.parser = parser
+        self.max_page_bytes = max_page_bytes
         self.session: Optional[httpx.AsyncClient] = None
+        self._http_pool = http_pool
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
@@ -46,6 +78,7 @@ class WebsiteScraper:
             'links': self.links,
             'link_texts': self.link_texts,
             'url': self.url,
+            'pages': self.pages,
         }
 
     @lru_cache(maxsize=100)
@@ -61,91 +94,179 @@ class WebsiteScraper:
         except Exception:
             return False
 
+    @property
+    def http_pool(self) -> HttpClientPool:
+        if self._http_pool is None:
+            self._http_pool = get_http_pool()
+        return self._http_pool
+
     async def _init_session(self):
-        """Initialize HTTP session with optimized settings."""
+        """Borrow the pooled HTTP client, keeping connections warm across scrapers."""
         if not self.session:
-            self.session = httpx.AsyncClient(
-                timeout=self.timeout,
-                follow_redirects=True,
-                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                }
-            )
+            self.session = self.http_pool.client
 
     def _clean_text(self, text: str) -> str:
         """Efficiently clean and normalize text."""
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        return text
+        return clean_text(text)
 
     async def _fetch_page(self, url: str, parse_links: bool = False) -> tuple[str, set]:
         """
-        Fetch and parse a single page with optimized BeautifulSoup parsing.
+        Fetch and parse a single page with the configured parser backend,
+        giving up after `page_timeout` seconds.
         Returns tuple of (cleaned_text, found_links).
         """
-        new_links = set()
-        
-        async with self.semaphore:
+        async with self.semaphore, self.http_pool.host_slot(url):
             try:
-                # Only parse links if needed (main page)
-                parse_only = None if parse_links else SoupStrainer(['p', 'article', 'section', 'div', 'nav'])
-                
-                response = await self.session.get(url)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser', parse_only=parse_only)
-
-                # Remove unwanted elements
-                for element in soup.select('script, style, footer, header, [class*="menu"]'):
-                    element.decompose() 
-
-                # Extract links if needed
-                if parse_links:
-                    for link in soup.find_all('a', href=True):
-                        href = urljoin(self.url, link['href'])
-                        if self._is_valid_url(href):
-                            new_links.add(href)
-
-                # Extract and clean text
-                text = self._clean_text(soup.get_text())
-                
-                return text, new_links
-
+                return await asyncio.wait_for(self._download_and_parse(url, parse_links), self.page_timeout)
+            except asyncio.TimeoutError:
+                self.logger.error(f"Timed out fetching {url} after {self.page_timeout}s")
+                return "", set()
+            except PageRejected as e:
+                self.logger.warning(f"Skipping {url}: {str(e)}")
+                return "", set()
             except Exception as e:
                 self.logger.error(f"Error fetching {url}: {str(e)}")
                 return "", set()
 
+    async def _download_and_parse(self, url: str, parse_links: bool) -> tuple[str, set]:
+        html = await self._download(url)
+        text, links = await async_parse_html(html, self.url, parse_links, self.parser)
+        # Keep only same-site page links
+        new_links = {link for link in links if self._is_valid_url(link)}
+        
+        return text, new_links
+
+    async def _download(self, url: str, known: Optional[dict] = None) -> Optional[str]:
+        """
+        Streams the page body, rejecting non-HTML responses from their headers
+        and stopping after `max_page_bytes`, so one huge response can't hold
+        more than that in memory.
+        
+        With the `known` validators of a previous download the request is
+        conditional, and None is returned when the server answers 304 or the
+        body hashes the same as before.
+        """
+        headers = {}
+        if known:
+            if known.get('etag'):
+                headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                headers['If-Modified-Since'] = known['last_modified']
+        
+        async with self.session.stream('GET', url, headers=headers, timeout=self.timeout) as response:
+            if known and response.status_code == 304:
+                self.pages[url] = dict(known)
+                return None
+            response.raise_for_status()
+            
+            content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            if content_type and content_type not in HTML_CONTENT_TYPES:
+                raise PageRejected(f"content type {content_type}")
+            
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= self.max_page_bytes:
+                    # A truncated page still parses, the tail is usually footer anyway
+                    self.logger.warning(f"Truncating {url} at {self.max_page_bytes} bytes")
+                    del body[self.max_page_bytes:]
+                    break
+            
+            self.pages[url] = {
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'content_hash': hashlib.sha256(body).hexdigest(),
+            }
+            if known and known.get('content_hash') == self.pages[url]['content_hash']:
+                return None
+            return body.decode(response.encoding or 'utf-8', errors='replace')
+
     async def scrape_main_page(self):
         """Scrape the main page and extract links."""
+        await self.http_pool.run(self._scrape_main_page())
+
+    async def _scrape_main_page(self):
         await self._init_session()
         self.home_page_text, links = await self._fetch_page(self.url, parse_links=True)
         self.links = random.choices(list(links), k=min(len(links), self.max_concurrent))
 
     async def scrape_linked_pages(self):
-        """Efficiently scrape all linked pages concurrently."""
-        chunks = [list(self.links)[i:i + 10] for i in range(0, len(self.links), 10)]
+        """
+        Scrape linked pages keeping `max_concurrent` requests in flight, so a
+        slow page only holds up its own slot. Pages still pending when the
+        time budget runs out are cancelled and the partial results kept.
+        """
+        await self.http_pool.run(self._scrape_linked_pages())
+
+    async def _scrape_linked_pages(self):
+        await self._init_session()
         
-        for chunk in chunks:
-            tasks = [self._fetch_page(link) for link in chunk]
-            results = await asyncio.gather(*tasks)
-            
-            for link, (text, _) in zip(chunk, results):
-                if text:  # Only store if we got valid text
-                    self.link_texts[link] = text
+        async def fetch(link: str):
+            text, _ = await self._fetch_page(link)
+            if text:  # Only store if we got valid text
+                self.link_texts[link] = text
+        
+        # The semaphore in _fetch_page starts the next link as soon as one finishes
+        tasks = [asyncio.ensure_future(fetch(link)) for link in dict.fromkeys(self.links)]
+        if not tasks:
+            return
+        deadline = self._deadline or time.monotonic() + self.time_budget
+        _, pending = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+        if pending:
+            self.budget_exhausted = True
+            self.logger.warning(
+                f"Time budget exhausted for {self.url}, returning {len(self.link_texts)} of {len(tasks)} pages"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     async def scrape_all(self):
-        """Scrape both the main page and all linked pages."""
+        """Scrape both the main page and all linked pages within `time_budget` seconds."""
+        await self.http_pool.run(self._scrape_all())
+
+    async def _scrape_all(self):
+        self._deadline = time.monotonic() + self.time_budget
         try:
-            await self._init_session()
-            await self.scrape_main_page()
-            await self.scrape_linked_pages()
+            await self._scrape_main_page()
+            await self._scrape_linked_pages()
         finally:
-            if self.session:
-                await self.session.aclose()
+            self._deadline = None
+
+    async def check_unchanged(self, validators: Dict[str, dict]) -> bool:
+        """
+        Conditionally re-downloads the pages of a previous scrape using their
+        stored validators. Returns True when every page answered 304 or hashed
+        the same, nothing is parsed then and previously generated questions
+        still apply. Any changed, failed or timed out page returns False.
+        """
+        return await self.http_pool.run(self._check_unchanged(validators))
+
+    async def _check_unchanged(self, validators: Dict[str, dict]) -> bool:
+        await self._init_session()
+        if self.url not in validators:
+            return False
+        
+        async def unchanged(url: str) -> bool:
+            async with self.semaphore, self.http_pool.host_slot(url):
+                try:
+                    html = await asyncio.wait_for(self._download(url, validators[url]), self.page_timeout)
+                    return html is None
+                except Exception as e:
+                    self.logger.info(f"Treating {url} as changed: {str(e) or type(e).__name__}")
+                    return False
+        
+        # The main page changing means a full rescrape, don't bother with the rest
+        if not await unchanged(self.url):
+            return False
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(unchanged(url) for url in validators if url != self.url)),
+                self.time_budget
+            )
+        except asyncio.TimeoutError:
+            return False
+        return all(results)
 
     def get_main_page_text(self) -> str:
         """Access the main page's scraped text."""
@@ -0,0 +1,114 @@
+import os
+import asyncio
+import time
+from typing import Optional, Union
+
+import redis
+import redis.asyncio as async_redis
+
+
+LOCK_TTL = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", 120))
+WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", 60))
+POLL_INTERVAL = 0.1
+
+# Only delete the lock if we still own it, so a holder whose lock expired
+# can't release a lock that has since been taken by another request.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _decode(value: Optional[Union[bytes, str]]) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def acquire(
+    redis_client: redis.Redis,
+    key: str,
+    owner: str,
+    ttl: int = LOCK_TTL
+) -> Optional[str]:
+    """
+    Try to become the single flight for `key`.
+
+    Returns None when the lock was taken by `owner`, otherwise the owner
+    currently holding it.
+    """
+    if redis_client.set(key, owner, nx=True, ex=ttl):
+        return None
+    current = _decode(redis_client.get(key))
+    # The lock may have expired between SET and GET; try once more.
+    if current is None and redis_client.set(key, owner, nx=True, ex=ttl):
+        return None
+    return current
+
+
+def release(redis_client: redis.Redis, key: str, owner: str) -> bool:
+    """Releases the lock on `key` if it is still held by `owner`."""
+    return bool(redis_client.eval(_RELEASE_SCRIPT, 1, key, owner))
+
+
+async def wait_for(
+    redis_client: redis.Redis,
+    key: str,
+    timeout: float = WAIT_TIMEOUT,
+    interval: float = POLL_INTERVAL,
+    lock_key: Optional[str] = None
+) -> Optional[bytes]:
+    """
+    Waits without blocking the event loop until `key` is set. Returns None on
+    timeout, or as soon as `lock_key` is released without `key` being set.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        value = redis_client.get(key)
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        if lock_key is not None and not redis_client.exists(lock_key):
+            # The lock holder finished (or died) without us seeing the value
+            return redis_client.get(key)
+        await asyncio.sleep(interval)
+
+
+async def async_acquire(
+    redis_client: async_redis.Redis,
+    key: str,
+    owner: str,
+    ttl: int = LOCK_TTL
+) -> Optional[str]:
+    """Async counterpart of `acquire` for redis.asyncio clients."""
+    if await redis_client.set(key, owner, nx=True, ex=ttl):
+        return None
+    current = _decode(await redis_client.get(key))
+    if current is None and await redis_client.set(key, owner, nx=True, ex=ttl):
+        return None
+    return current
+
+
+async def async_release(redis_client: async_redis.Redis, key: str, owner: str) -> bool:
+    """Async counterpart of `release` for redis.asyncio clients."""
+    return bool(await redis_client.eval(_RELEASE_SCRIPT, 1, key, owner))
+
+
+async def async_wait_for(
+    redis_client: async_redis.Redis,
+    key: str,
+    timeout: float = WAIT_TIMEOUT,
+    interval: float = POLL_INTERVAL,
+    lock_key: Optional[str] = None
+) -> Optional[bytes]:
+    """Async counterpart of `wait_for` for redis.asyncio clients."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = await redis_client.get(key)
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        if lock_key is not None and not await redis_client.exists(lock_key):
+            # The lock holder finished (or died) without us seeing the value
+            return await redis_client.get(key)
+        await asyncio.sleep(interval)
@@ -0,0 +1,120 @@
+import os
+import io
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import NoCredentialsError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", 8))
+MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+
+# Shared by every backend so the number of uploads in flight is bounded
+# process-wide, whichever event loop (or thread) they come from.
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="storage-upload")
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """Process-wide S3 client. boto3 clients are thread-safe and keep their connection pool."""
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv("AWS_ACCESS"),
+        aws_secret_access_key=os.getenv('AWS_SECRET'),
+        config=Config(max_pool_connections=UPLOAD_CONCURRENCY * 2)
+    )
+
+
+class StorageBackend(ABC):
+    """Where preview images end up. `save` returns the public URL of the stored object."""
+
+    @abstractmethod
+    def save(self, key: str, data: bytes, content_type: str) -> Optional[str]:
+        ...
+
+    async def asave(self, key: str, data: bytes, content_type: str) -> Optional[str]:
+        """Runs `save` on the shared upload thread pool so the event loop keeps serving requests."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_upload_executor, self.save, key, data, content_type)
+
+
+class S3Storage(StorageBackend):
+    """
+    Uploads objects to an S3 bucket straight from memory. Images above
+    MULTIPART_THRESHOLD are sent as a multipart upload in parallel parts.
+    """
+
+    def __init__(self, bucket_name: Optional[str] = None, client=None, transfer_config: Optional[TransferConfig] = None):
+        self.bucket_name = bucket_name or os.getenv('AWS_BUCKET')
+        self.client = client or get_s3_client()
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            use_threads=True
+        )
+
+    def save(self, key: str, data: bytes, content_type: str) -> Optional[str]:
+        try:
+            self.client.upload_fileobj(
+                io.BytesIO(data), self.bucket_name, key,
+                ExtraArgs={'ContentType': content_type},
+                Config=self.transfer_config
+            )
+        except NoCredentialsError:
+            logger.error("Credentials not available")
+            return None
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{key}"
+
+
+class LocalStorage(StorageBackend):
+    """Writes objects to a local directory, e.g. one served by a static file server."""
+
+    def __init__(self, directory: Optional[str] = None, base_url: Optional[str] = None):
+        self.directory = Path(directory or os.getenv('STORAGE_DIR', 'previews')).resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.base_url = (base_url or os.getenv('STORAGE_BASE_URL') or self.directory.as_uri()).rstrip('/')
+
+    def save(self, key: str, data: bytes, content_type: str) -> Optional[str]:
+        path = self.directory / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return f"{self.base_url}/{key}"
+
+
+class MemoryStorage(StorageBackend):
+    """Keeps objects in a dict. Meant for tests and local development."""
+
+    def __init__(self):
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+
+    def save(self, key: str, data: bytes, content_type: str) -> Optional[str]:
+        self.objects[key] = (data, content_type)
+        return f"memory://{key}"
+
+
+BACKENDS = {
+    's3': S3Storage,
+    'local': LocalStorage,
+    'memory': MemoryStorage,
+}
+
+
+def get_storage(backend: Optional[str] = None) -> StorageBackend:
+    """Builds the storage backend named by `backend` or the STORAGE_BACKEND env var (default s3)."""
+    name = (backend or os.getenv('STORAGE_BACKEND', 's3')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return BACKENDS[name]()
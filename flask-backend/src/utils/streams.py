@@ -0,0 +1,251 @@
+import os
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import redis
+import redis.asyncio as async_redis
+
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+IDLE_TIMEOUT = float(os.getenv("SSE_IDLE_TIMEOUT", 300))
+MAX_QUEUE_SIZE = int(os.getenv("SSE_MAX_QUEUE_SIZE", 100))
+EVENTS_TTL = int(os.getenv("SESSION_EVENTS_TTL", 3600))
+EVENTS_MAXLEN = int(os.getenv("SESSION_EVENTS_MAXLEN", 1000))
+CHANNEL_PREFIX = "questions:"
+TERMINAL_STATUSES = ('complete', 'error')
+
+
+def events_key(session_id: str) -> str:
+    """Redis Stream holding the replayable event log of a session."""
+    return f"{CHANNEL_PREFIX}{session_id}:events"
+
+
+def _parse_id(entry_id: Union[bytes, str, None]) -> Tuple[int, int]:
+    """Turns a stream entry ID like '1700000000000-3' into a comparable tuple."""
+    if not entry_id:
+        return (0, 0)
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode('utf-8')
+    ms, _, seq = entry_id.partition('-')
+    return (int(ms), int(seq or 0))
+
+
+async def publish_event(redis_client: async_redis.Redis, session_id: str, data: dict) -> str:
+    """
+    Appends an event to the session's log and notifies live subscribers.
+
+    The log expires EVENTS_TTL seconds after the last event, so clients that
+    connect late (or reconnect) can still replay everything the task sent.
+    """
+    entry_id = await redis_client.xadd(
+        events_key(session_id),
+        {'data': json.dumps(data)},
+        maxlen=EVENTS_MAXLEN,
+        approximate=True
+    )
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode('utf-8')
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.expire(events_key(session_id), EVENTS_TTL)
+        pipe.publish(f"{CHANNEL_PREFIX}{session_id}", json.dumps({'id': entry_id, 'data': data}))
+        await pipe.execute()
+    return entry_id
+
+
+def seed_events(redis_client: redis.Redis, session_id: str, events: List[dict]) -> None:
+    """
+    Writes the events of a brand-new session in one pipelined round trip.
+
+    Nothing is published because no client can be subscribed to a session
+    that hasn't been handed out yet, they pick the events up from the replay.
+    """
+    key = events_key(session_id)
+    pipe = redis_client.pipeline(transaction=False)
+    for data in events:
+        pipe.xadd(key, {'data': json.dumps(data)}, maxlen=EVENTS_MAXLEN, approximate=True)
+    pipe.expire(key, EVENTS_TTL)
+    pipe.execute()
+
+
+class SessionStreams:
+    """
+    Fans question updates out from a single Redis pub/sub connection to the
+    SSE clients of this process.
+
+    One background thread pattern-subscribes to every `questions:*` channel
+    and pushes each message onto the queues of the clients watching that
+    session, so clients block on their queue instead of each polling their
+    own Redis connection. Events published with `publish_event` are also
+    kept in a per-session Redis Stream that new clients replay first.
+
+    Only the Redis connection is shared: every open stream still occupies
+    the WSGI worker thread blocked in its generator, so concurrent streams
+    per process are capped by the server's thread count (e.g. `--threads`
+    under gunicorn). Thousands of streams per process need a gevent worker
+    (`gunicorn -k gevent`), where monkey-patching turns these threads and
+    queues into greenlets.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_queue_size: int = MAX_QUEUE_SIZE
+    ):
+        self.redis_client = redis_client
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[queue.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def subscribe(self, session_id: str) -> queue.Queue:
+        """Registers a new client queue for the session."""
+        self._ensure_listening()
+        messages = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[session_id].add(messages)
+        return messages
+
+    def unsubscribe(self, session_id: str, messages: queue.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(session_id)
+            if subscribers is None:
+                return
+            subscribers.discard(messages)
+            if not subscribers:
+                del self._subscribers[session_id]
+
+    def publish_local(self, session_id: str, data: dict, entry_id: Optional[str] = None) -> None:
+        """Delivers a message to this process' subscribers of the session."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        terminal = isinstance(data, dict) and data.get('status') in TERMINAL_STATUSES
+        for messages in subscribers:
+            try:
+                messages.put_nowait((entry_id, data))
+            except queue.Full:
+                if not terminal:
+                    logger.warning(f"Dropping message for slow client on session {session_id}")
+                    continue
+                # The client must still learn the session ended, so make room
+                logger.warning(f"Dropping oldest message for slow client on session {session_id}")
+                try:
+                    messages.get_nowait()
+                except queue.Empty:
+                    pass
+                messages.put_nowait((entry_id, data))
+
+    def replay(self, session_id: str, after: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+        """Yields (entry_id, data) for the logged events of the session newer than `after`."""
+        last = _parse_id(after)
+        for entry_id, fields in self.redis_client.xrange(events_key(session_id), min=after or '-'):
+            if _parse_id(entry_id) <= last:
+                continue
+            if isinstance(entry_id, bytes):
+                entry_id = entry_id.decode('utf-8')
+            yield entry_id, json.loads(fields.get(b'data') or fields.get('data'))
+
+    def stream(self, session_id: str, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields SSE-formatted events for the session until it completes, errors,
+        or sees no data for `idle_timeout` seconds. Logged events after
+        `last_event_id` are replayed first, then live ones are tailed. Sends a
+        comment line every `heartbeat_interval` seconds so proxies keep the
+        connection open.
+        """
+        # Subscribe before replaying so nothing published in between is lost,
+        # live duplicates of replayed events are skipped by entry ID.
+        messages = self.subscribe(session_id)
+        last_id = _parse_id(last_event_id)
+        last_data = time.monotonic()
+        try:
+            for entry_id, data in self.replay(session_id, last_event_id):
+                last_id = _parse_id(entry_id)
+                yield self._format(data, entry_id)
+                if data.get('status') in TERMINAL_STATUSES:
+                    return
+            
+            while True:
+                remaining = self.idle_timeout - (time.monotonic() - last_data)
+                if remaining <= 0:
+                    logger.info(f"Closing idle stream for session {session_id}")
+                    break
+                try:
+                    entry_id, data = messages.get(timeout=min(self.heartbeat_interval, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                if entry_id is not None:
+                    if _parse_id(entry_id) <= last_id:
+                        continue
+                    last_id = _parse_id(entry_id)
+                last_data = time.monotonic()
+                yield self._format(data, entry_id)
+                # Check if processing is complete
+                if data.get('status') in TERMINAL_STATUSES:
+                    break
+        finally:
+            self.unsubscribe(session_id, messages)
+
+    @staticmethod
+    def _format(data: dict, entry_id: Optional[str] = None) -> str:
+        event = f"id: {entry_id}\n" if entry_id else ""
+        return f"{event}data: {json.dumps(data)}\n\n"
+
+    def _ensure_listening(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._listen, name="sse-listener", daemon=True)
+                self._thread.start()
+        # Don't hand out a queue before the pattern subscription is active
+        self._ready.wait(timeout=5)
+
+    def _listen(self) -> None:
+        backoff = 0.5
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                # Wait for the subscription to be confirmed before reporting ready
+                pubsub.get_message(timeout=1)
+                self._ready.set()
+                backoff = 0.5
+                for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    self._dispatch(message)
+            except redis.ConnectionError as e:
+                logger.error(f"SSE listener lost Redis connection: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                pubsub.close()
+
+    def _dispatch(self, message: dict) -> None:
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        session_id = channel[len(CHANNEL_PREFIX):]
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed message on {channel}")
+            return
+        entry_id = None
+        if isinstance(data, dict) and set(data) == {'id', 'data'}:
+            # Notification for an event appended by publish_event
+            entry_id, data = data['id'], data['data']
+        self.publish_local(session_id, data, entry_id)
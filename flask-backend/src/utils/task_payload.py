@@ -0,0 +1,111 @@
+import os
+from typing import Any, Dict, List
+
+import redis
+import redis.asyncio as async_redis
+
+from src.utils import content_store
+
+
+PAYLOAD_VERSION = 1
+# Page texts longer than this are parked in Redis instead of the broker message
+INLINE_TEXT_BYTES = int(os.getenv("TASK_INLINE_TEXT_BYTES", 1024))
+# How long parked texts wait for a worker to pick the task up
+TEXT_TTL = int(os.getenv("TASK_TEXT_TTL", 3600))
+TEXT_KEY_PREFIX = "payload:text"
+
+# Field name -> type of every field of a version 1 payload
+_SCHEMA = {
+    'v': int,
+    'url': str,
+    'links': list,
+    'texts': dict,
+    'refs': dict,
+    'pages': dict,
+}
+
+
+class PayloadError(ValueError):
+    """A task payload that is malformed, from another version, or whose texts expired."""
+
+
+def dump(redis_client: redis.Redis, scraper) -> Dict[str, Any]:
+    """
+    Compact task arguments for the pages a `WebsiteScraper` scraped.
+
+    Texts up to `INLINE_TEXT_BYTES` travel inline, longer ones are stored
+    compressed in Redis under a key derived from their hash (so concurrent
+    sessions share them) and only the key is sent.
+    """
+    texts = {scraper.url: scraper.home_page_text, **scraper.link_texts}
+    inline, refs = {}, {}
+    pipe = redis_client.pipeline(transaction=False)
+    for url, text in texts.items():
+        if len(text.encode('utf-8')) <= INLINE_TEXT_BYTES:
+            inline[url] = text
+            continue
+        refs[url] = f"{TEXT_KEY_PREFIX}:{content_store.text_hash(text)}"
+        pipe.set(refs[url], content_store.compress(text), ex=TEXT_TTL)
+    if refs:
+        pipe.execute()
+
+    payload = {
+        'v': PAYLOAD_VERSION,
+        'url': scraper.url,
+        'links': list(dict.fromkeys(scraper.links)),
+        'texts': inline,
+        'refs': refs,
+        'pages': {
+            url: [validators.get('etag'), validators.get('last_modified'), validators['content_hash']]
+            for url, validators in scraper.pages.items()
+        },
+    }
+    check(payload)
+    return payload
+
+
+def check(payload: Any) -> None:
+    """Raises PayloadError unless `payload` is a well formed payload of this version."""
+    if not isinstance(payload, dict):
+        raise PayloadError(f"Expected a dict payload, got {type(payload).__name__}")
+    if payload.get('v') != PAYLOAD_VERSION:
+        raise PayloadError(f"Unsupported payload version {payload.get('v')!r}, expected {PAYLOAD_VERSION}")
+    for field, field_type in _SCHEMA.items():
+        if not isinstance(payload.get(field), field_type):
+            raise PayloadError(f"Payload field {field!r} should be a {field_type.__name__}")
+    if payload['url'] not in payload['texts'] and payload['url'] not in payload['refs']:
+        raise PayloadError("Payload has no main page text")
+    if not all(isinstance(link, str) for link in payload['links']):
+        raise PayloadError("Payload links should be strings")
+    if not all(isinstance(text, str) for text in payload['texts'].values()):
+        raise PayloadError("Payload texts should be strings")
+    if not all(isinstance(validators, list) and len(validators) == 3 for validators in payload['pages'].values()):
+        raise PayloadError("Payload pages should be [etag, last_modified, content_hash]")
+
+
+async def load(redis_client: async_redis.Redis, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The scraped info (`url`, `main_page_text`, `links`, `link_texts`,
+    `pages`) a payload describes, with parked texts fetched back.
+    """
+    check(payload)
+    texts = dict(payload['texts'])
+    if payload['refs']:
+        urls: List[str] = list(payload['refs'])
+        values = await redis_client.mget([payload['refs'][url] for url in urls])
+        for url, value in zip(urls, values):
+            if value is None:
+                raise PayloadError(f"Text of {url} expired before the task ran")
+            texts[url] = content_store.decompress(value)
+
+    url = payload['url']
+    return {
+        'url': url,
+        'main_page_text': texts.pop(url),
+        'links': payload['links'],
+        'link_texts': texts,
+        'pages': {
+            page: {'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash}
+            for page, (etag, last_modified, content_hash) in payload['pages'].items()
+        },
+    }
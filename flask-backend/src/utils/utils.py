@@ -1,40 +1,75 @@
 import os
-from playwright.async_api import async_playwright
-from tempfile import NamedTemporaryFile
-import boto3
-from botocore.exceptions import NoCredentialsError
+import io
+from playwright.async_api import Page
 from dotenv import load_dotenv
+from PIL import Image
+from typing import List, Optional, Tuple
+
+from src.utils.browser_pool import get_browser_pool
 
 load_dotenv()
 
+IMAGE_FORMAT = os.getenv("PREVIEW_IMAGE_FORMAT", "png").lower()
+IMAGE_QUALITY = int(os.getenv("PREVIEW_IMAGE_QUALITY", 80))
+THUMBNAIL_WIDTH = int(os.getenv("PREVIEW_THUMBNAIL_WIDTH", 0))  # 0 keeps the full width
+
+IMAGE_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def format_question_for_api(questions: List) -> List[dict]:
+    """Converts stored Question rows into the payload shape published to clients."""
+    return [
+        {
+            'question': question.text,
+            'options': [option.text for option in question.options]
+        }
+        for question in questions
+    ]
 
-def upload_to_s3(file_path: str, bucket_name: str, object_name: str) -> str:
-    """Uploads the file to S3 and returns the public URL."""
-    try:
-        s3_client = boto3.client('s3', aws_access_key_id=os.getenv("AWS_ACCESS"), aws_secret_access_key=os.getenv('AWS_SECRET'))
-        s3_client.upload_file(
-            file_path, bucket_name, object_name,
-        )
-        s3_url = f"https://{bucket_name}.s3.amazonaws.com/{object_name}"
-    except NoCredentialsError:
-        print("Credentials not available")
-        return None
-    finally:
-        os.remove(file_path)  # Clean up the local file
-    return s3_url
-
-
-async def capture_screenshot(url: str) -> str:
-    """Captures screenshot of the given URL and saves it temporarily."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+
+async def capture_screenshot_bytes(url: str, full_page: bool = True) -> bytes:
+    """Captures a PNG screenshot of the given URL in memory, without touching disk."""
+    async def screenshot(page: Page) -> bytes:
         await page.goto(url)
+        return await page.screenshot(full_page=full_page)
+    
+    return await get_browser_pool().run(screenshot)
+
+
+def encode_image(
+    data: bytes,
+    image_format: str = IMAGE_FORMAT,
+    max_width: Optional[int] = THUMBNAIL_WIDTH,
+    quality: int = IMAGE_QUALITY
+) -> Tuple[bytes, str, str]:
+    """
+    Re-encodes a PNG screenshot and optionally downscales it to `max_width`.
+    
+    Returns tuple of (image_bytes, file_extension, content_type). PNG input is
+    passed through untouched when no conversion or resizing is needed.
+    """
+    image_format = image_format.lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    pil_format, content_type = IMAGE_FORMATS[image_format]
+    
+    with Image.open(io.BytesIO(data)) as image:
+        resize = bool(max_width) and image.width > max_width
+        if image_format == 'png' and not resize:
+            return data, image_format, content_type
         
-        # Using NamedTemporaryFile to save screenshot temporarily
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            await page.screenshot(path=temp_file.name, full_page=True)
-            temp_file_path = temp_file.name  # Path of the screenshot
-        await browser.close()
+        if resize:
+            height = round(image.height * max_width / image.width)
+            image = image.resize((max_width, height), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
         
-    return temp_file_path
\ No newline at end of file
+        output = io.BytesIO()
+        image.save(output, format=pil_format, quality=quality, optimize=True)
+    return output.getvalue(), image_format, content_type
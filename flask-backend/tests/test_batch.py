@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import batch
+from src.crud import create_website_with_questions, get_page_texts, get_questions_from_url, get_website_id
+from src.models import Base
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    """
+    In-memory SQLite session factory patched in for the batch's own sessions
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    with patch.object(batch, 'async_session', factory):
+        yield factory
+    await engine.dispose()
+
+
+class FakeScraper:
+    """
+    WebsiteScraper stand-in that fails for hosts in `failing` and tracks concurrency per domain
+    """
+    failing = set()
+    active = {}
+    peak = {}
+    
+    def __init__(self, url):
+        self.url = url
+        self.home_page_text = f"Text of {url}"
+        self.links = [f"{url}about"]
+        self.link_texts = {f"{url}about": "About us"}
+        self.pages = {url: {'etag': None, 'last_modified': None, 'content_hash': 'abc'}}
+    
+    async def scrape_all(self):
+        domain = batch.domain_of(self.url)
+        FakeScraper.active[domain] = FakeScraper.active.get(domain, 0) + 1
+        FakeScraper.peak[domain] = max(FakeScraper.peak.get(domain, 0), FakeScraper.active[domain])
+        await asyncio.sleep(0.01)
+        FakeScraper.active[domain] -= 1
+        if domain in FakeScraper.failing:
+            self.home_page_text = ""
+    
+    def __json__(self):
+        return {'url': self.url, 'main_page_text': self.home_page_text, 'links': self.links, 'link_texts': self.link_texts}
+
+
+@pytest.fixture
+def fake_pipeline():
+    """
+    Scraper and question generator replaced with fakes
+    """
+    FakeScraper.failing, FakeScraper.active, FakeScraper.peak = set(), {}, {}
+    
+    def make_generator(scraped_info, cache=None):
+        generator = MagicMock()
+        generator.async_generate_questions = AsyncMock(
+            return_value=[{'question': f"About {scraped_info['url']}?", 'options': ['A', 'B']}]
+        )
+        return generator
+    
+    with patch.object(batch, 'WebsiteScraper', FakeScraper), \
+         patch.object(batch, 'QuestionGenerator', side_effect=make_generator):
+        yield FakeScraper
+
+
+@pytest.mark.asyncio
+async def test_batch_stores_in_bulk_and_resumes(session_factory, fake_pipeline):
+    """
+    Test a batch stores new sites, skips stored ones, records failures and only retries those on a rerun
+    """
+    urls = [f"https://site{i}.com/" for i in range(5)] + ["https://broken.com/", "https://stored.com/"]
+    async with session_factory() as db:
+        await create_website_with_questions(db, "https://stored.com/", [{'question': 'Q?', 'options': ['A']}])
+    fake_pipeline.failing = {"broken.com"}
+    redis_client = fakeredis.FakeAsyncRedis()
+    
+    report = await batch.run_batch(urls, redis_client, batch_id="test", write_size=2)
+    
+    assert (report['stored'], report['skipped'], report['failed']) == (5, 1, 1)
+    async with session_factory() as db:
+        assert [q.text for q in await get_questions_from_url(db, "https://site3.com/")] == ["About https://site3.com/?"]
+        texts = await get_page_texts(db, await get_website_id(db, "https://site3.com/"))
+        assert texts["https://site3.com/"] == "Text of https://site3.com/"
+    status = await batch.batch_status(redis_client, "test")
+    assert list(status['failures']) == ["https://broken.com/"]
+    
+    fake_pipeline.failing = set()
+    report = await batch.run_batch(urls, redis_client, batch_id="test")
+    
+    assert (report['stored'], report['skipped'], report['failed']) == (1, 6, 0)
+    assert (await batch.batch_status(redis_client, "test"))['failures'] == {}
+
+
+@pytest.mark.asyncio
+async def test_batch_limits_concurrency_per_domain(session_factory, fake_pipeline):
+    """
+    Test URLs of one domain are processed at most `per_domain` at a time while other domains proceed
+    """
+    urls = [f"https://www.big.com/page{i}/" for i in range(6)] + [f"https://small{i}.com/" for i in range(3)]
+    
+    report = await batch.run_batch(urls, fakeredis.FakeAsyncRedis(), concurrency=5, per_domain=2)
+    
+    assert report['stored'] == 9
+    assert fake_pipeline.peak["big.com"] == 2
+
+
+
+@pytest.mark.asyncio
+async def test_failed_write_fails_its_sites_only(session_factory, fake_pipeline):
+    """
+    Test a bulk write that raises marks its sites failed without stopping the rest of the batch
+    """
+    urls = [f"https://site{i}.com/" for i in range(4)]
+    redis_client = fakeredis.FakeAsyncRedis()
+    store = batch.bulk_create_websites_with_questions
+    
+    async def flaky_store(db, sites):
+        if any(site['url'] == "https://site0.com/" for site in sites):
+            raise RuntimeError("database unavailable")
+        return await store(db, sites)
+    
+    with patch.object(batch, 'bulk_create_websites_with_questions', side_effect=flaky_store):
+        report = await batch.run_batch(urls, redis_client, batch_id="test", concurrency=1, write_size=2)
+    
+    assert (report['stored'], report['failed']) == (2, 2)
+    status = await batch.batch_status(redis_client, "test")
+    assert sorted(status['failures']) == ["https://site0.com/", "https://site1.com/"]
+    async with session_factory() as db:
+        assert await get_website_id(db, "https://site0.com/") is None
+        assert await get_website_id(db, "https://site3.com/") is not None
+
+
+def test_read_urls(tmp_path):
+    """
+    Test URL files skip blanks, comments and duplicates
+    """
+    path = tmp_path / "urls.txt"
+    path.write_text("# imported\nhttps://a.com/\n\nhttps://b.com/  # partner\nhttps://a.com/\n")
+    
+    assert batch.read_urls(str(path)) == ["https://a.com/", "https://b.com/"]
@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.utils.browser_pool import BrowserPool
+
+
+def make_browser():
+    """
+    Build a fake Playwright browser whose contexts and pages are mocks
+    """
+    browser = MagicMock()
+    browser.is_connected.return_value = True
+    browser.close = AsyncMock()
+    
+    async def new_context():
+        context = MagicMock()
+        context.browser = browser
+        context.close = AsyncMock()
+        page = MagicMock()
+        page.is_closed.return_value = False
+        context.new_page = AsyncMock(return_value=page)
+        return context
+    
+    browser.new_context = AsyncMock(side_effect=new_context)
+    return browser
+
+
+@pytest.fixture
+def mock_playwright():
+    """
+    Patch async_playwright so the pool launches fake browsers
+    """
+    with patch('src.utils.browser_pool.async_playwright') as mock_async_playwright:
+        playwright = MagicMock()
+        playwright.stop = AsyncMock()
+        playwright.chromium.launch = AsyncMock(side_effect=lambda **kwargs: make_browser())
+        mock_async_playwright.return_value.start = AsyncMock(return_value=playwright)
+        yield playwright
+
+
+@pytest.mark.asyncio
+async def test_pages_are_reused_and_recycled(mock_playwright):
+    """
+    Test that the browser is launched once and pages are recycled after max_uses
+    """
+    pool = BrowserPool(size=1, max_uses=3)
+    try:
+        pages = [await pool.run(AsyncMock(side_effect=lambda page: page)) for _ in range(4)]
+        
+        assert mock_playwright.chromium.launch.await_count == 1
+        # First three jobs share a page, the fourth gets a fresh one
+        assert pages[0] is pages[1] is pages[2]
+        assert pages[3] is not pages[0]
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_recycles_page(mock_playwright):
+    """
+    Test that a page is not handed out again after a job fails on it
+    """
+    pool = BrowserPool(size=1, max_uses=10)
+    try:
+        seen = []
+        
+        async def failing_job(page):
+            seen.append(page)
+            raise RuntimeError("navigation failed")
+        
+        with pytest.raises(RuntimeError):
+            await pool.run(failing_job)
+        page = await pool.run(AsyncMock(side_effect=lambda page: page))
+        
+        assert page is not seen[0]
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_disconnected_browser_is_relaunched(mock_playwright):
+    """
+    Test the health check relaunches a crashed browser
+    """
+    pool = BrowserPool(size=2, max_uses=10)
+    try:
+        await pool.run(AsyncMock())
+        pool._browser.is_connected.return_value = False
+        
+        await pool.run(AsyncMock())
+        
+        assert mock_playwright.chromium.launch.await_count == 2
+    finally:
+        pool.close()
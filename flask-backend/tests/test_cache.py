@@ -0,0 +1,85 @@
+import pytest
+import fakeredis
+from src.utils import cache
+
+
+def test_normalize_url():
+    """
+    Test equivalent spellings of a URL share one cache key
+    """
+    assert cache.normalize_url("http://Example.com") == cache.normalize_url("https://example.com/")
+    assert cache.normalize_url("https://example.com:443/a/?b=2&a=1#top") == "example.com/a?a=1&b=2"
+    assert cache.normalize_url("https://example.com:8080/") == "example.com:8080"
+    assert cache.normalize_url("https://example.com/a") != cache.normalize_url("https://example.com/b")
+
+
+def test_set_applies_ttl_and_compression():
+    """
+    Test entries expire per namespace and large values are stored compressed
+    """
+    redis_client = fakeredis.FakeRedis()
+    questions = [{'question': f'Question {i}?', 'options': ['Yes', 'No']} for i in range(50)]
+    cache.QUESTIONS.set(redis_client, "https://site.com/", questions)
+    
+    key = cache.QUESTIONS.key("http://site.com")
+    assert 0 < redis_client.ttl(key) <= cache.QUESTIONS.ttl
+    assert redis_client.strlen(key) < len(str(questions)) / 4
+    assert cache.QUESTIONS.get(redis_client, "http://site.com") == questions
+
+
+def test_stats_report_hits_and_bytes():
+    """
+    Test stats count hits and misses and measure stored bytes per namespace
+    """
+    redis_client = fakeredis.FakeRedis()
+    cache.LINKS.set(redis_client, "https://site.com/", ["https://site.com/a"])
+    
+    assert cache.get_many(redis_client, [(cache.QUESTIONS, "https://site.com/"), (cache.LINKS, "https://site.com/")]) == [
+        None, ["https://site.com/a"]
+    ]
+    cache.LINKS.get(redis_client, "https://site.com")
+    
+    report = cache.stats(redis_client)
+    assert report['links']['hits'] == 2 and report['links']['hit_ratio'] == 1.0
+    assert report['questions'] == {'hits': 0, 'misses': 1, 'hit_ratio': 0.0, 'keys': 0, 'bytes': 0}
+    assert report['links']['keys'] == 1 and report['links']['bytes'] > 0
+
+
+
+def test_cached_lookup_takes_one_round_trip():
+    """
+    Test a fully cached lookup, its stats and the popularity count share one pipeline
+    """
+    import redis
+    from unittest.mock import patch
+    from src.utils import popularity
+    
+    redis_client = fakeredis.FakeRedis()
+    cache.QUESTIONS.set(redis_client, "https://site.com/", ["q"])
+    cache.LINKS.set(redis_client, "https://site.com/", ["a"])
+    
+    execute = redis.client.Pipeline.execute
+    with patch.object(redis.client.Pipeline, 'execute', autospec=True, side_effect=execute) as round_trips, \
+         patch.object(fakeredis.FakeRedis, 'mget') as mget:
+        values = cache.get_many(
+            redis_client,
+            [(cache.QUESTIONS, "https://site.com/"), (cache.LINKS, "https://site.com/")],
+            record=lambda pipe: popularity.record_request(pipe, "https://site.com/")
+        )
+    
+    assert values == [["q"], ["a"]]
+    assert round_trips.call_count == 1
+    mget.assert_not_called()
+    assert redis_client.zscore(popularity.POPULARITY_KEY, "https://site.com/") == 1
+    assert cache.stats(redis_client)['questions']['hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_client_round_trip():
+    """
+    Test the async helpers read what they wrote, honouring nx
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    assert await cache.LINKS.async_set(redis_client, "https://site.com/", ["a"])
+    assert not await cache.LINKS.async_set(redis_client, "https://site.com/", ["b"], nx=True)
+    assert await cache.LINKS.async_get(redis_client, "https://site.com/") == ["a"]
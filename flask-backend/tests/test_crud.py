@@ -0,0 +1,211 @@
+import pytest
+from unittest.mock import patch
+import pytest_asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.crud import (
+    bulk_create_questions_for_website, bulk_create_websites_with_questions, create_website, create_website_with_questions, delete_orphaned_page_contents,
+    get_page_texts, get_questions_by_website_id, get_questions_from_url, get_website_id, list_websites, save_pages,
+    website_exists
+)
+from src.models import Base, PageContent
+from src.utils import content_store
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def db():
+    """
+    In-memory SQLite session with foreign keys enforced, plus a list of executed statements
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    statements = []
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def enable_foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+    
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        session.statements = statements
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_questions_single_round_trip(db):
+    """
+    Test questions and options are inserted with one statement each and returned with options
+    """
+    website = await create_website(db, "https://site.com/")
+    questions_data = [
+        {'question': f'Question {i}?', 'options': [f'{i}a', f'{i}b', f'{i}c']}
+        for i in range(50)
+    ]
+    db.statements.clear()
+    
+    questions = await bulk_create_questions_for_website(db, website.id, questions_data)
+    
+    assert len(db.statements) == 2
+    assert [q.text for q in questions] == [q['question'] for q in questions_data]
+    assert [[o.text for o in q.options] for q in questions] == [q['options'] for q in questions_data]
+    stored = await get_questions_by_website_id(db, website.id)
+    assert sorted(len(q.options) for q in stored) == [3] * 50
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_questions_unknown_website(db):
+    """
+    Test inserting questions for a missing website raises ValueError
+    """
+    with pytest.raises(ValueError):
+        await bulk_create_questions_for_website(db, 999, [{'question': 'Q?', 'options': ['A']}])
+
+
+@pytest.mark.asyncio
+async def test_create_website_with_questions_skips_when_stored(db):
+    """
+    Test a second worker storing the same URL backs off instead of failing
+    """
+    questions_data = [{'question': 'Q?', 'options': ['A', 'B']}]
+    website_id = await create_website_with_questions(db, "https://site.com/", questions_data)
+    
+    assert website_id is not None
+    assert await create_website_with_questions(db, "https://site.com/", questions_data) is None
+    assert len(await get_questions_by_website_id(db, website_id)) == 1
+    assert [q.options[0].text for q in await get_questions_from_url(db, "https://site.com/")] == ['A']
+    assert await get_questions_from_url(db, "https://missing.com/") is None
+
+
+@pytest.mark.asyncio
+async def test_create_website_with_questions_fills_existing_website(db):
+    """
+    Test a website stored without questions gets the generated set
+    """
+    website = await create_website(db, "https://site.com/")
+    
+    website_id = await create_website_with_questions(db, "https://site.com/", [{'question': 'Q?', 'options': ['A']}])
+    
+    assert website_id == website.id
+    assert [q.text for q in await get_questions_by_website_id(db, website.id)] == ['Q?']
+
+
+@pytest.mark.asyncio
+async def test_list_websites_keyset_pagination(db):
+    """
+    Test websites are paged by ID without loading their content
+    """
+    for i in range(5):
+        await create_website(db, f"https://site{i}.com/", content="x" * 1000)
+    db.expunge_all()
+    
+    first = await list_websites(db, limit=2)
+    second = await list_websites(db, limit=2, after_id=first[-1].id)
+    rest = await list_websites(db, limit=2, after_id=second[-1].id)
+    
+    assert [w.url for w in first + second + rest] == [f"https://site{i}.com/" for i in range(5)]
+    assert 'content' not in first[0].__dict__
+    assert await get_website_id(db, "https://site3.com/") == second[-1].id
+    assert await website_exists(db, "https://site0.com/")
+    assert not await website_exists(db, "https://missing.com/")
+
+
+@pytest.mark.asyncio
+async def test_page_texts_compressed_and_deduplicated(db):
+    """
+    Test page texts are stored compressed once across sites and read back lazily
+    """
+    shared = "Welcome to our site. " * 200
+    pages = {
+        "https://a.com/": {'content_hash': 'a'},
+        "https://a.com/about": {'content_hash': 'b'},
+        "https://a.com/asset": {'content_hash': 'c'},
+    }
+    texts = {"https://a.com/": shared, "https://a.com/about": "About us"}
+    a_id = await create_website_with_questions(db, "https://a.com/", [{'question': 'Q?', 'options': ['A']}], pages, texts)
+    b = await create_website(db, "https://b.com/")
+    await save_pages(db, b.id, {"https://b.com/": {'content_hash': 'a'}}, {"https://b.com/": shared})
+    
+    stored = (await db.scalars(select(PageContent))).all()
+    assert len(stored) == 2
+    assert sum(len(content.data) for content in stored) < len(shared) // 10
+    
+    a_texts = await get_page_texts(db, a_id)
+    assert sorted(a_texts) == ["https://a.com/", "https://a.com/about"]
+    assert a_texts._texts == {}
+    assert a_texts["https://a.com/"] == shared
+    assert list(a_texts._texts) == ["https://a.com/"]
+    
+    # The shared text stays until no page refers to it
+    await save_pages(db, a_id, {}, {})
+    assert await delete_orphaned_page_contents(db) == 1
+    assert dict(await get_page_texts(db, b.id)) == {"https://b.com/": shared}
+
+
+@pytest.mark.asyncio
+async def test_stored_texts_are_upserted(db):
+    """
+    Test texts already stored still go through the locking upsert instead of being skipped, and pruning then keeps them
+    """
+    website = await create_website(db, "https://a.com/")
+    pages = {"https://a.com/": {'content_hash': 'a'}}
+    texts = {"https://a.com/": "Main page"}
+    await save_pages(db, website.id, pages, texts)
+    db.statements.clear()
+    
+    await save_pages(db, website.id, pages, texts)
+    
+    assert any(statement.startswith("INSERT INTO page_contents") and "ON CONFLICT" in statement for statement in db.statements)
+    assert not any(statement.startswith("SELECT page_contents") for statement in db.statements)
+    assert await delete_orphaned_page_contents(db) == 0
+    assert dict(await get_page_texts(db, website.id)) == texts
+
+
+def test_decompress_reads_either_codec():
+    """
+    Test texts compressed with zlib stay readable when zstandard is available and vice versa
+    """
+    text = "page text " * 100
+    with patch.object(content_store, 'zstandard', None):
+        zlib_data = content_store.compress(text)
+    assert zlib_data[:1] == b'z'
+    assert content_store.decompress(zlib_data) == text
+    assert content_store.decompress(content_store.compress(text)) == text
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_websites_constant_statements(db):
+    """
+    Test storing many websites takes the same statements as storing two, leaving ones with questions alone
+    """
+    await create_website_with_questions(db, "https://done.com/", [{'question': 'Old?', 'options': ['A']}])
+    
+    def sites(count):
+        return [
+            {
+                'url': f"https://site{count}-{i}.com/",
+                'questions': [{'question': f'Q{i}?', 'options': ['A', 'B']}],
+                'pages': {f"https://site{count}-{i}.com/": {'content_hash': str(i)}},
+                'texts': {f"https://site{count}-{i}.com/": f"Text {i}"},
+            }
+            for i in range(count)
+        ]
+    
+    db.statements.clear()
+    await bulk_create_websites_with_questions(db, sites(2))
+    small = len(db.statements)
+    db.statements.clear()
+    website_ids = await bulk_create_websites_with_questions(db, sites(40) + [{'url': "https://done.com/", 'questions': [{'question': 'New?', 'options': []}]}])
+    
+    assert len(db.statements) == small + 1  # the lookup of the already stored website
+    assert len(website_ids) == 40
+    assert [q.text for q in await get_questions_from_url(db, "https://done.com/")] == ['Old?']
+    assert (await get_page_texts(db, website_ids["https://site40-7.com/"]))["https://site40-7.com/"] == "Text 7"
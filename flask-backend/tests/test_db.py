@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import text
+
+from src import db
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.mark.asyncio
+async def test_pool_records_checkout_wait(tmp_path, monkeypatch):
+    """
+    Test the tuned engine pools connections and records checkout waits
+    """
+    engine = db.make_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(db, 'engine', engine)
+    db.pool_metrics.reset()
+    try:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                assert await conn.scalar(text("SELECT 1")) == 1
+        
+        stats = db.pool_stats()
+        assert stats['checkouts'] >= 1
+        assert stats['wait_max'] >= stats['wait_avg'] >= 0
+        assert stats['checked_out'] == 0
+        assert engine.echo is False
+    finally:
+        await engine.dispose()
+
+
+def test_reset_engine_rebinds_sessions(tmp_path, monkeypatch):
+    """
+    Test a forked worker's reset gives sessions a fresh engine and pool
+    """
+    engine = db.make_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(db, 'engine', engine)
+    original_bind = db.async_session.kw['bind']
+    try:
+        db.reset_engine()
+        
+        assert db.engine is not engine
+        assert db.async_session.kw['bind'] is db.engine
+        assert str(db.engine.url) == str(engine.url)
+    finally:
+        db.async_session.configure(bind=original_bind)
@@ -0,0 +1,74 @@
+import pytest
+from src.utils.html_parser import async_parse_html, parse_html
+
+PAGE = """<html><head><title>Site</title><script>var tracked = true;</script></head>
+<body>
+<header>Logo</header>
+<div class="main-menu"><a href="/menu">Menu entry</a></div>
+<h1>Heading</h1>
+<div><p>Hello <b>world</b></p><section>Inner</section></div>
+<a href="/about">About</a><a href="https://other.com/x">Other</a>
+<footer>Footer text</footer>
+</body></html>"""
+
+BACKENDS = ['html.parser', 'lxml', 'selectolax']
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    """
+    Each parser backend, skipping those whose library isn't installed
+    """
+    if request.param != 'html.parser':
+        pytest.importorskip(request.param)
+    return request.param
+
+
+def test_main_page_text_and_links(backend):
+    """
+    Test backends drop boilerplate elements and resolve links in one pass
+    """
+    text, links = parse_html(PAGE, "https://site.com/", parse_links=True, backend=backend)
+
+    assert "Hello" in text and "world" in text and "Heading" in text
+    assert "tracked" not in text
+    assert "Logo" not in text and "Footer" not in text and "Menu entry" not in text
+    assert links == {"https://site.com/about", "https://other.com/x"}
+
+
+def test_subpage_keeps_content_tags_only(backend):
+    """
+    Test subpages only keep text from content tags and skip link extraction
+    """
+    text, links = parse_html(PAGE, "https://site.com/", parse_links=False, backend=backend)
+
+    assert text.replace(" ", "") == "HelloworldInner"
+    assert links == set()
+
+
+def test_unknown_backend():
+    """
+    Test an unknown backend name is rejected
+    """
+    with pytest.raises(ValueError):
+        parse_html(PAGE, "https://site.com/", backend="regex")
+
+
+@pytest.mark.asyncio
+async def test_large_pages_parse_off_loop():
+    """
+    Test pages above the offload threshold are parsed in the worker pool
+    """
+    inline = await async_parse_html(PAGE, "https://site.com/", True, 'html.parser')
+    offloaded = await async_parse_html(PAGE, "https://site.com/", True, 'html.parser', offload_bytes=0)
+
+    assert offloaded == inline
+
+
+def test_worker_pools_never_fork():
+    """
+    Test the process pools start workers without forking a process that runs background threads
+    """
+    from src.utils.html_parser import process_context
+    
+    assert process_context().get_start_method() in ("forkserver", "spawn")
@@ -63,4 +63,156 @@ def test_question_generation(mock_url_info):
         # Check that the mock is working as expected
         assert isinstance(questions, list)
         assert len(questions) == 0
-        
\ No newline at end of file
+        
+
+@pytest.mark.asyncio
+async def test_post_with_retries_backs_off_on_server_errors():
+    """
+    Test retryable statuses are retried and then succeed
+    """
+    import httpx
+    from src.utils.llm import post_with_retries
+    
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+    
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        response = await post_with_retries(client, "https://llm.test/v1", backoff=0.01, json={})
+    
+    assert response.json() == {"ok": True}
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_post_with_retries_gives_up():
+    """
+    Test non-retryable and exhausted retries raise
+    """
+    import httpx
+    from src.utils.llm import post_with_retries
+    
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(401))) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await post_with_retries(client, "https://llm.test/v1", backoff=0.01)
+    
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(429))) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await post_with_retries(client, "https://llm.test/v1", max_retries=1, backoff=0.01)
+
+
+@pytest.mark.asyncio
+async def test_async_generate_questions(mock_url_info):
+    """
+    Test the async pipeline with mocked LLM calls records per-stage timings
+    """
+    import httpx
+    from unittest.mock import AsyncMock, MagicMock
+    from concurrent.futures import ThreadPoolExecutor
+    
+    questions = [{"question": "What is your role?", "options": ["Developer", "Manager"]}]
+    
+    def arliai(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(questions)}}]})
+    
+    generator = QuestionGenerator(mock_url_info)
+    analysis = MagicMock(text=json.dumps({"topics": [], "industry": [], "target_audience": "developers"}))
+    
+    with patch('src.utils.llm.get_keyword_executor', return_value=ThreadPoolExecutor(2)), \
+         patch('src.utils.llm.get_http_client', return_value=httpx.AsyncClient(transport=httpx.MockTransport(arliai))), \
+         patch.object(generator.model, 'generate_content_async', AsyncMock(return_value=analysis)):
+        result = await generator.async_generate_questions()
+    
+    assert result == questions
+    assert set(generator.timings) == {'keywords', 'analysis', 'questions', 'total'}
+    assert all(0 < tokens <= generator.token_budget for tokens in generator.prompt_tokens.values())
+
+
+def test_rake_keywords_is_thread_safe():
+    """
+    Test concurrent keyword extraction on a thread pool matches running it alone
+    """
+    import sys
+    import functools
+    from concurrent.futures import ThreadPoolExecutor
+    from rake_nltk import Rake
+    from src.utils import llm
+    
+    # Inline stopwords and tokenizers so no NLTK data is needed
+    rake = functools.partial(
+        Rake,
+        stopwords={'the', 'a', 'and', 'of', 'for', 'with'},
+        sentence_tokenizer=lambda text: text.split('.'),
+        word_tokenizer=str.split
+    )
+    texts = [
+        " ".join(f"Site {i} sells tool {j} for builders. The shop {i} ships order {j} with care." for j in range(50 * (i % 4 + 1)))
+        for i in range(40)
+    ]
+    switch_interval = sys.getswitchinterval()
+    with patch.object(llm, 'Rake', rake), patch.object(llm, '_rake_local', llm.threading.local()):
+        expected = [llm.rake_keywords(text, 10) for text in texts]
+        # Switch threads often so extractions interleave
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(llm.rake_keywords, texts, [10] * len(texts)))
+        finally:
+            sys.setswitchinterval(switch_interval)
+    
+    assert results == expected
+
+
+def test_json_array_stream_yields_complete_elements():
+    """
+    Test array elements are returned as soon as they close, whatever the chunking
+    """
+    from src.utils.json_stream import JsonArrayStream
+    
+    questions = [{"question": "Which {plan} fits, \"pro\" or [basic]?", "options": ["Pro", "Basic"]}, {"question": "Q2?", "options": []}]
+    text = "```json\n" + json.dumps(questions) + "\n```"
+    parser = JsonArrayStream()
+    
+    first_end = text.index("]}") + 2
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end + 5]) == [questions[0]]
+    assert parser.feed(text[first_end + 5:]) == [questions[1]]
+    assert parser.done
+
+
+@pytest.mark.asyncio
+async def test_stream_json_array_hands_out_questions_incrementally():
+    """
+    Test questions streamed over SSE are handed out one by one, and a plain completion still works
+    """
+    import httpx
+    from src.utils.llm import stream_json_array
+    
+    questions = [{"question": f"Question {i}?", "options": ["A", "B"]} for i in range(4)]
+    content = json.dumps(questions)
+    chunks = [content[i:i + 7] for i in range(0, len(content), 7)]
+    sse = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n" for chunk in chunks
+    ) + "data: [DONE]\n\n"
+    received = []
+    
+    async def on_item(item):
+        received.append(item)
+    
+    def arliai(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=sse, headers={'content-type': 'text/event-stream'})
+    
+    async with httpx.AsyncClient(transport=httpx.MockTransport(arliai)) as client:
+        result = await stream_json_array(client, "https://llm.test/v1", on_item, json={"stream": True})
+    assert result == received == questions
+    
+    received.clear()
+    plain = httpx.MockTransport(lambda request: httpx.Response(200, json={"choices": [{"message": {"content": content}}]}))
+    async with httpx.AsyncClient(transport=plain) as client:
+        assert await stream_json_array(client, "https://llm.test/v1", on_item, json={"stream": True}) == questions
+    assert received == questions
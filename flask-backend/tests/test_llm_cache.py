@@ -0,0 +1,57 @@
+import itertools
+import fakeredis
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.utils.llm_cache import LLMCache, content_hash
+
+
+def test_content_hash_is_normalised():
+    """
+    Test cosmetic differences in the prompt inputs share a cache key
+    """
+    keywords = {'main_page_keywords': [('business', 0.8)]}
+    
+    assert content_hash("Example  Website\n", keywords) == content_hash("example website", keywords)
+    assert content_hash("Example Website", keywords) != content_hash("Another website", keywords)
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_hits_and_misses():
+    """
+    Test responses are computed once, stored with a TTL and counted
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    cache = LLMCache(redis_client, ttl=60)
+    compute = AsyncMock(return_value={'topics': ['tech']})
+    
+    first = await cache.get_or_compute('analysis', 'abc', compute)
+    second = await cache.get_or_compute('analysis', 'abc', compute)
+    
+    assert first == second == {'topics': ['tech']}
+    compute.assert_awaited_once()
+    assert 0 < await redis_client.ttl(cache.key('analysis', 'abc')) <= 60
+    
+    stats = await cache.stats()
+    assert stats['analysis'] == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+    assert stats['entries'] == {'count': 1}
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted():
+    """
+    Test the cache stays within max_entries by evicting the oldest accessed entry
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    cache = LLMCache(redis_client, max_entries=2)
+    
+    with patch('src.utils.llm_cache.time') as mock_time:
+        mock_time.time.side_effect = itertools.count()
+        await cache.set('questions', 'a', [1])
+        await cache.set('questions', 'b', [2])
+        await cache.get('questions', 'a')  # 'a' is now more recent than 'b'
+        await cache.set('questions', 'c', [3])
+    
+    assert await cache.get('questions', 'b') is None
+    assert await cache.get('questions', 'a') == [1]
+    assert await cache.get('questions', 'c') == [3]
+    assert await redis_client.zcard(cache.lru_key) == 2
@@ -0,0 +1,75 @@
+from src.utils.prompt_budget import (
+    estimate_tokens, fit_keywords, fit_text, split_segments, strip_boilerplate
+)
+
+
+def test_split_segments_caps_long_runs():
+    """
+    Test text without punctuation is still cut into bounded segments
+    """
+    text = "Home About Pricing " * 50 + "We build tools. They are fast!"
+    segments = split_segments(text, max_chars=100)
+    
+    assert all(len(segment) <= 100 for segment in segments)
+    assert segments[-1] == "They are fast!"
+    assert " ".join(segments) == text
+
+
+def test_strip_boilerplate_removes_repeated_segments():
+    """
+    Test segments shared across pages are dropped from sublinks and kept once on the main page
+    """
+    footer = "Copyright 2024 Example Inc. All rights reserved."
+    main_text = f"Example builds analytics software. {footer}"
+    link_texts = {
+        'https://www.example.com/about': f"We started in 2010. {footer}",
+        'https://www.example.com/jobs': f"We are hiring engineers. {footer}",
+    }
+    
+    main, links = strip_boilerplate(main_text, link_texts)
+    
+    assert main == main_text
+    assert links == {
+        'https://www.example.com/about': "We started in 2010.",
+        'https://www.example.com/jobs': "We are hiring engineers.",
+    }
+
+
+def test_fit_text_keeps_highest_scoring_sentences_in_order():
+    """
+    Test truncation prefers sentences with high RAKE scores and keeps reading order
+    """
+    text = " ".join([
+        "Welcome to our site.",
+        "We sell industrial robotics automation platforms.",
+        "Filler sentence that says nothing useful at all here.",
+        "Our robotics platforms serve manufacturing plants.",
+    ])
+    phrase_scores = [("industrial robotics automation platforms", 16.0), ("manufacturing plants", 4.0)]
+    
+    fitted = fit_text(text, phrase_scores, budget=30)
+    
+    assert estimate_tokens(fitted) <= 30
+    assert fitted == "We sell industrial robotics automation platforms. Our robotics platforms serve manufacturing plants."
+    assert fit_text("short text", phrase_scores, budget=30) == "short text"
+
+
+def test_fit_keywords_drops_lowest_scoring_sublink_keywords():
+    """
+    Test keyword trimming stays within the budget and keeps the best keywords
+    """
+    keywords = {
+        'main_page_keywords': [('analytics', 4.0)],
+        'sublink_keywords': {
+            f'https://www.example.com/page{i}': [(f'keyword number {i}', float(i)), (f'other phrase {i}', 0.5)]
+            for i in range(50)
+        },
+    }
+    
+    trimmed = fit_keywords(keywords, budget=100)
+    
+    assert estimate_tokens(str(trimmed)) <= 100
+    assert trimmed['main_page_keywords'] == [('analytics', 4.0)]
+    assert ('keyword number 49', 49.0) in trimmed['sublink_keywords']['https://www.example.com/page49']
+    assert 'https://www.example.com/page0' not in trimmed['sublink_keywords']
+    assert fit_keywords(keywords, budget=100000) is keywords
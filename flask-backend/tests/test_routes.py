@@ -1,8 +1,12 @@
 import pytest
 import httpx
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from asgiref.wsgi import WsgiToAsgi
+import fakeredis
 from src.app import app  
+from src.utils import cache
+from src.utils.storage import S3Storage
+from tests.test_utils import make_png
 
 app = WsgiToAsgi(app)
 
@@ -44,18 +48,16 @@ async def test_preview_image_endpoint():
     """
     Test the preview image endpoint
     - Verify successful image generation
-    - Check S3 URL return
+    - Check storage URL return
     """
     url = "https://www.example.com"
     async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
-        with patch('src.app.capture_screenshot') as mock_capture, \
-             patch('src.app.upload_to_s3') as mock_upload:
+        with patch('src.app.redis_client', fakeredis.FakeRedis()), \
+             patch('src.app.capture_screenshot_bytes') as mock_capture, \
+             patch('src.app.storage', S3Storage(bucket_name="bucket", client=MagicMock())):
             
-            # Mock screenshot capture
-            mock_capture.return_value = "/tmp/screenshot.png"
-            
-            # Mock S3 upload
-            mock_upload.return_value = "https://bucket.s3.amazonaws.com/screenshot.png"
+            # Mock in-memory screenshot capture
+            mock_capture.return_value = make_png(1280, 2000)
 
             response = await client.get(f"/preview-img/?url={url}")
             
@@ -63,7 +65,7 @@ async def test_preview_image_endpoint():
             data = response.json()
             
             assert "image" in data
-            assert data["image"].startswith("https://")
+            assert data["image"].startswith("https://bucket.s3.amazonaws.com/")
 
 
 @pytest.mark.asyncio
@@ -78,4 +80,78 @@ async def test_invalid_url_handling():
 
         # Test empty URL
         response = await client.get("/generate-content/?url=")
-        assert response.status_code == 400
\ No newline at end of file
+        assert response.status_code == 400
+
+
+def test_concurrent_generate_content_is_coalesced():
+    """
+    Test that concurrent requests for the same URL scrape and queue generation once
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from src.app import app as flask_app
+    
+    url = "https://www.example.com"
+    with patch('src.app.redis_client', fakeredis.FakeRedis()), \
+         patch('src.app.WebsiteScraper') as MockScraper, \
+         patch('src.app.process_links_task') as mock_task:
+        
+        async def slow_scrape():
+            await asyncio.sleep(0.5)
+        
+        mock_scraper_instance = MagicMock()
+        mock_scraper_instance._is_valid_url.return_value = True
+        mock_scraper_instance.scrape_all = AsyncMock(side_effect=slow_scrape)
+        mock_scraper_instance.url = url
+        mock_scraper_instance.links = [f"{url}/page1", f"{url}/page2"]
+        mock_scraper_instance.home_page_text = "Main text"
+        mock_scraper_instance.link_texts = {f"{url}/page1": "Page text"}
+        mock_scraper_instance.pages = {url: {'etag': None, 'last_modified': None, 'content_hash': 'abc'}}
+        MockScraper.return_value = mock_scraper_instance
+        
+        def request_content(_):
+            return flask_app.test_client().get(f"/generate-content/?url={url}")
+        
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(request_content, range(5)))
+        
+        assert all(response.status_code == 200 for response in responses)
+        session_ids = {response.get_json()["session_id"] for response in responses}
+        assert len(session_ids) == 1
+        assert mock_scraper_instance.scrape_all.await_count == 1
+        assert mock_task.delay.call_count == 1
+        payload = mock_task.delay.call_args.args[1]
+        assert payload['texts'] == {url: "Main text", f"{url}/page1": "Page text"}
+
+
+@pytest.mark.asyncio
+async def test_generate_content_cached_questions_fast_path():
+    """
+    Test fully cached URLs are answered inline without queueing a task
+    """
+    import json
+    from src.utils.streams import SessionStreams
+    
+    url = "https://www.example.com"
+    questions = [{"question": "What brings you here?", "options": ["Work", "Fun"]}]
+    redis_client = fakeredis.FakeRedis()
+    cache.QUESTIONS.set(redis_client, url, questions)
+    cache.LINKS.set(redis_client, url, [url])
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        with patch('src.app.redis_client', redis_client), \
+             patch('src.app.process_links_task') as mock_task:
+            
+            response = await client.get(f"/generate-content/?url={url}")
+            
+            assert response.status_code == 200
+            data = response.json()
+            assert data["questions"] == questions
+            assert data["links"] == [url]
+            mock_task.delay.assert_not_called()
+            
+            # The SSE stream replays the questions and completion
+            events = list(SessionStreams(redis_client).stream(data["session_id"]))
+            assert len(events) == 2
+            assert json.loads(events[0].split("data: ")[1]) == {"link": url, "questions": questions}
+            assert events[1].endswith('data: {"status": "complete"}\n\n')
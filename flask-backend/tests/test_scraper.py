@@ -73,4 +73,213 @@ async def test_text_cleaning():
     dirty_text = "   Multiple   \n\n  Whitespace   Test   "
     cleaned_text = scraper._clean_text(dirty_text)
     
-    assert cleaned_text == "Multiple Whitespace Test"
\ No newline at end of file
+    assert cleaned_text == "Multiple Whitespace Test"
+
+@pytest.fixture
+def local_site():
+    """
+    Local keep-alive HTTP server with a main page linking to two subpages,
+    a /slow page that takes two seconds to answer and a binary /download.
+    Pages carry an ETag and answer If-None-Match with 304, except /b.
+    Yields the base URL and a dict counting connections, requests and 304s,
+    whose 'pages' entry can be edited to change what is served.
+    """
+    import hashlib
+    import time
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    stats = {'connections': 0, 'requests': 0, 'not_modified': 0}
+    pages = {
+        '/': '<html><body><p>Main page</p><a href="/a">A</a><a href="/b">B</a></body></html>',
+        '/a': '<html><body><p>Page A text</p></body></html>',
+        '/b': '<html><body><p>Page B text</p></body></html>',
+        '/slow': '<html><body><p>Slow page text</p></body></html>',
+        '/download': 'x' * 100000,
+    }
+    stats['pages'] = pages
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def setup(self):
+            stats['connections'] += 1
+            super().setup()
+        
+        def do_GET(self):
+            stats['requests'] += 1
+            if self.path == '/slow':
+                time.sleep(2)
+            body = pages.get(self.path, '').encode()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.path != '/b' and self.headers.get('If-None-Match') == etag:
+                stats['not_modified'] += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200 if self.path in pages else 404)
+            self.send_header('ETag', etag)
+            content_type = 'application/octet-stream' if self.path == '/download' else 'text/html; charset=utf-8'
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except ConnectionError:
+                pass
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/", stats
+    server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_scrapers_share_pooled_connections(local_site):
+    """
+    Test scrapers borrow one pooled client and reuse its connections
+    """
+    from src.utils.http_pool import HttpClientPool
+    
+    url, stats = local_site
+    pool = HttpClientPool(http2=False)
+    try:
+        first = WebsiteScraper(url, http_pool=pool)
+        second = WebsiteScraper(url, http_pool=pool)
+        await first.scrape_all()
+        await second.scrape_all()
+        
+        assert first.session is second.session
+        assert first.link_texts
+        assert set(first.link_texts.values()) <= {"Page A text", "Page B text"}
+        assert second.home_page_text.startswith("Main page")
+        # Keep-alive connections are reused by the second scraper
+        assert stats['requests'] >= 4
+        assert stats['connections'] <= 2
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_page_does_not_stall_budget(local_site):
+    """
+    Test a slow link is dropped at the time budget while the others are kept
+    """
+    import time
+    from src.utils.http_pool import HttpClientPool
+    
+    url, _ = local_site
+    pool = HttpClientPool(http2=False)
+    try:
+        scraper = WebsiteScraper(url, max_concurrent=2, http_pool=pool, time_budget=0.5)
+        scraper.links = {url + "slow", url + "a", url + "b"}
+        
+        start = time.monotonic()
+        await scraper.scrape_linked_pages()
+        
+        assert time.monotonic() - start < 1.5
+        assert scraper.budget_exhausted
+        assert scraper.link_texts == {url + "a": "Page A text", url + "b": "Page B text"}
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_page_timeout_returns_empty(local_site):
+    """
+    Test a page that misses its deadline is skipped instead of raising
+    """
+    from src.utils.http_pool import HttpClientPool
+    
+    url, _ = local_site
+    pool = HttpClientPool(http2=False)
+    try:
+        scraper = WebsiteScraper(url, http_pool=pool, page_timeout=0.2)
+        scraper.links = {url + "slow", url + "a"}
+        await scraper.scrape_linked_pages()
+        
+        assert not scraper.budget_exhausted
+        assert scraper.link_texts == {url + "a": "Page A text"}
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_download_rejects_non_html_and_caps_size(local_site):
+    """
+    Test non-HTML responses are skipped and long pages are cut at the byte cap
+    """
+    from src.utils.http_pool import HttpClientPool
+    
+    url, _ = local_site
+    pool = HttpClientPool(http2=False)
+    try:
+        scraper = WebsiteScraper(url, http_pool=pool, max_page_bytes=20)
+        scraper.links = {url + "download", url + "a"}
+        await scraper.scrape_linked_pages()
+        
+        assert url + "download" not in scraper.link_texts
+        # Only the first 20 bytes of page A are parsed
+        assert scraper.link_texts == {url + "a": "Page"}
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_check_unchanged_uses_validators(local_site):
+    """
+    Test a rescrape with stored validators spots unchanged and changed pages
+    """
+    from src.utils.http_pool import HttpClientPool
+    
+    url, stats = local_site
+    pool = HttpClientPool(http2=False)
+    try:
+        first = WebsiteScraper(url, http_pool=pool)
+        await first.scrape_main_page()
+        first.links = {url + "a", url + "b"}
+        await first.scrape_linked_pages()
+        validators = first.pages
+        assert set(validators) == {url, url + "a", url + "b"}
+        assert all(v['etag'] and v['content_hash'] for v in validators.values())
+        
+        # /a and the main page answer 304, /b ignores the ETag but hashes the same
+        assert await WebsiteScraper(url, http_pool=pool).check_unchanged(validators)
+        assert stats['not_modified'] == 2
+        
+        stats['pages']['/b'] = '<html><body><p>Page B changed</p></body></html>'
+        assert not await WebsiteScraper(url, http_pool=pool).check_unchanged(validators)
+        # Never scraped before
+        assert not await WebsiteScraper(url, http_pool=pool).check_unchanged({})
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_host_slots_are_dropped():
+    """
+    Test per-host semaphores are limited while busy and forgotten once idle
+    """
+    import asyncio
+    from src.utils.http_pool import HttpClientPool
+    
+    pool = HttpClientPool(per_host_limit=2)
+    in_flight = peak = 0
+    
+    async def request(url):
+        nonlocal in_flight, peak
+        async with pool.host_slot(url):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+    
+    await asyncio.gather(*(request(f"https://site.com/{i}") for i in range(6)))
+    assert peak == 2
+    await asyncio.gather(*(request(f"https://site{i}.com/") for i in range(50)))
+    
+    assert pool._host_limits == {} and pool._host_users == {}
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+import fakeredis
+from src.utils import singleflight
+
+
+def test_acquire_and_release():
+    """
+    Test that only one owner holds the lock at a time
+    """
+    redis_client = fakeredis.FakeRedis()
+    
+    assert singleflight.acquire(redis_client, "url:lock", "first") is None
+    assert singleflight.acquire(redis_client, "url:lock", "second") == "first"
+    
+    # Only the owner can release
+    assert singleflight.release(redis_client, "url:lock", "second") is False
+    assert singleflight.release(redis_client, "url:lock", "first") is True
+    assert singleflight.acquire(redis_client, "url:lock", "second") is None
+
+
+@pytest.mark.asyncio
+async def test_wait_for_stops_when_lock_released():
+    """
+    Test that waiters return early once the leader lets go of the lock
+    """
+    redis_client = fakeredis.FakeRedis()
+    singleflight.acquire(redis_client, "url:lock", "leader")
+    
+    async def leader():
+        await asyncio.sleep(0.05)
+        redis_client.set("url:result", "done")
+        singleflight.release(redis_client, "url:lock", "leader")
+    
+    value, _ = await asyncio.gather(
+        singleflight.wait_for(redis_client, "url:result", timeout=5, interval=0.01, lock_key="url:lock"),
+        leader()
+    )
+    assert value == b"done"
+    
+    # A released lock with no result should not make us wait for the timeout
+    singleflight.acquire(redis_client, "other:lock", "leader")
+    singleflight.release(redis_client, "other:lock", "leader")
+    value = await singleflight.wait_for(redis_client, "other:result", timeout=5, interval=0.01, lock_key="other:lock")
+    assert value is None
+
+
+@pytest.mark.asyncio
+async def test_async_acquire_and_wait():
+    """
+    Test the redis.asyncio variants
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    
+    assert await singleflight.async_acquire(redis_client, "url:lock", "first") is None
+    assert await singleflight.async_acquire(redis_client, "url:lock", "second") == "first"
+    
+    await redis_client.set("url:questions", "[]")
+    value = await singleflight.async_wait_for(redis_client, "url:questions", timeout=1, lock_key="url:lock")
+    assert value == b"[]"
+    
+    assert await singleflight.async_release(redis_client, "url:lock", "first") is True
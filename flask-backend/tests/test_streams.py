@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import fakeredis
+from unittest.mock import MagicMock
+import pytest
+from src.utils.streams import SessionStreams, events_key, publish_event
+
+
+@pytest.fixture
+def redis_client():
+    """
+    Fake Redis server shared by the publisher and the stream listener
+    """
+    return fakeredis.FakeRedis()
+
+
+def test_messages_fan_out_to_session_subscribers(redis_client):
+    """
+    Test a single listener delivers messages only to the matching session's clients
+    """
+    streams = SessionStreams(redis_client)
+    redis_client.pubsub = MagicMock(wraps=redis_client.pubsub)
+    first = streams.subscribe("abc")
+    second = streams.subscribe("abc")
+    other = streams.subscribe("xyz")
+    
+    redis_client.publish("questions:abc", '{"questions": []}')
+    
+    assert first.get(timeout=2) == (None, {"questions": []})
+    assert second.get(timeout=2) == (None, {"questions": []})
+    assert other.empty()
+    # One Redis pub/sub connection no matter how many clients
+    redis_client.pubsub.assert_called_once()
+
+
+def test_stream_ends_on_completion(redis_client):
+    """
+    Test the stream forwards data and closes after the completion message
+    """
+    streams = SessionStreams(redis_client, heartbeat_interval=5)
+    events = streams.stream("abc")
+    
+    def publish():
+        time.sleep(0.1)
+        redis_client.publish("questions:abc", '{"link": "https://www.example.com", "questions": []}')
+        redis_client.publish("questions:abc", '{"status": "complete"}')
+    
+    threading.Thread(target=publish).start()
+    
+    assert list(events) == [
+        'data: {"link": "https://www.example.com", "questions": []}\n\n',
+        'data: {"status": "complete"}\n\n',
+    ]
+    assert "abc" not in streams._subscribers
+
+
+def test_stream_heartbeat_and_idle_timeout(redis_client):
+    """
+    Test heartbeats are sent while waiting and idle streams are closed
+    """
+    streams = SessionStreams(redis_client, heartbeat_interval=0.05, idle_timeout=0.3)
+    
+    start = time.monotonic()
+    events = list(streams.stream("idle"))
+    
+    assert time.monotonic() - start < 2
+    assert len(events) >= 2
+    assert all(event == ": keep-alive\n\n" for event in events)
+
+
+@pytest.fixture
+def redis_pair():
+    """
+    Sync and async fake Redis clients on the same server, like the app and the worker
+    """
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+
+def test_late_subscriber_replays_session_log(redis_pair):
+    """
+    Test a client connecting after the task finished still gets every event
+    """
+    redis_client, async_client = redis_pair
+    
+    async def run_task():
+        await publish_event(async_client, "abc", {"link": "https://www.example.com", "questions": []})
+        await publish_event(async_client, "abc", {"status": "complete"})
+    asyncio.run(run_task())
+    
+    streams = SessionStreams(redis_client, heartbeat_interval=5)
+    events = list(streams.stream("abc"))
+    
+    assert len(events) == 2
+    assert events[0].startswith("id: ")
+    assert events[0].endswith('data: {"link": "https://www.example.com", "questions": []}\n\n')
+    assert events[1].endswith('data: {"status": "complete"}\n\n')
+    assert redis_client.ttl(events_key("abc")) > 0
+    
+    # Reconnecting with Last-Event-ID only resumes what came after it
+    first_id = events[0].split("\n")[0][len("id: "):]
+    assert list(streams.stream("abc", last_event_id=first_id)) == events[1:]
+
+
+def test_replayed_events_are_not_duplicated_live(redis_pair):
+    """
+    Test events seen in the replay are skipped when their live copy arrives
+    """
+    redis_client, async_client = redis_pair
+    asyncio.run(publish_event(async_client, "abc", {"questions": []}))
+    
+    streams = SessionStreams(redis_client, heartbeat_interval=5)
+    entry_id = redis_client.xrange(events_key("abc"))[0][0].decode()
+    events = streams.stream("abc")
+    
+    assert next(events).endswith('data: {"questions": []}\n\n')
+    # A late live copy of the replayed event, then the completion
+    streams.publish_local("abc", {"questions": []}, entry_id)
+    asyncio.run(publish_event(async_client, "abc", {"status": "complete"}))
+    
+    assert [event.split("\n")[-3] for event in events] == ['data: {"status": "complete"}']
+
+
+def test_terminal_event_reaches_slow_client(redis_client):
+    """
+    Test a full client queue drops its oldest message rather than the completion event
+    """
+    streams = SessionStreams(redis_client, max_queue_size=2)
+    messages = streams.subscribe("slow")
+    
+    for i in range(3):
+        streams.publish_local("slow", {"questions": [i]})
+    streams.publish_local("slow", {"status": "complete"})
+    
+    assert [messages.get_nowait()[1] for _ in range(2)] == [{"questions": [1]}, {"status": "complete"}]
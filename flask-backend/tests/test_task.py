@@ -0,0 +1,284 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+
+from src import task
+from src.utils import cache, popularity
+
+
+@pytest.fixture
+def tracked_website():
+    """
+    Stored website with the crud helpers used by refresh patched
+    """
+    website = MagicMock(id=7)
+    mocks = {
+        'get_website_id': AsyncMock(return_value=website.id),
+        'get_questions_by_website_id': AsyncMock(return_value=[]),
+        'get_page_validators': AsyncMock(return_value={"https://site.com/": {'etag': '"1"', 'content_hash': 'abc'}}),
+        'touch_website': AsyncMock(),
+        'save_pages': AsyncMock(),
+        'delete_questions_for_website': AsyncMock(),
+        'bulk_create_questions_for_website': AsyncMock(),
+    }
+    with patch.multiple(task, **mocks):
+        yield website, mocks
+
+
+@pytest.mark.asyncio
+async def test_refresh_unchanged_skips_generation(tracked_website):
+    """
+    Test an unchanged site keeps its questions without scraping or LLM calls
+    """
+    _, mocks = tracked_website
+    redis_client = fakeredis.FakeAsyncRedis()
+    with patch.object(task.WebsiteScraper, 'check_unchanged', AsyncMock(return_value=True)), \
+         patch.object(task.WebsiteScraper, 'scrape_all', AsyncMock()) as scrape_all, \
+         patch.object(task, 'QuestionGenerator') as generator:
+        regenerated = await task.refresh_website("https://site.com/", redis_client)
+
+    assert regenerated is False
+    scrape_all.assert_not_called()
+    generator.assert_not_called()
+    mocks['touch_website'].assert_awaited_once()
+    mocks['bulk_create_questions_for_website'].assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_refresh_changed_regenerates(tracked_website):
+    """
+    Test a changed site is rescraped and its questions replaced and cached
+    """
+    _, mocks = tracked_website
+    redis_client = fakeredis.FakeAsyncRedis()
+    questions = [{'question': 'Q?', 'options': ['A', 'B']}]
+    generator = MagicMock()
+    generator.async_generate_questions = AsyncMock(return_value=questions)
+    
+    async def scrape_all(self):
+        self.home_page_text = "Main page"
+    
+    with patch.object(task.WebsiteScraper, 'check_unchanged', AsyncMock(return_value=False)), \
+         patch.object(task.WebsiteScraper, 'scrape_all', autospec=True, side_effect=scrape_all) as scrape_all, \
+         patch.object(task, 'QuestionGenerator', return_value=generator):
+        regenerated = await task.refresh_website("https://site.com/", redis_client)
+
+    assert regenerated is True
+    scrape_all.assert_awaited_once()
+    mocks['delete_questions_for_website'].assert_awaited_once()
+    mocks['bulk_create_questions_for_website'].assert_awaited_once()
+    assert await task.get_cached_questions(redis_client, "https://site.com/") == questions
+
+
+@pytest.mark.asyncio
+async def test_refresh_failed_scrape_keeps_questions(tracked_website):
+    """
+    Test a rescrape that returns no main page text fails without touching the stored questions or pages
+    """
+    _, mocks = tracked_website
+    redis_client = fakeredis.FakeAsyncRedis()
+    with patch.object(task.WebsiteScraper, 'check_unchanged', AsyncMock(return_value=False)), \
+         patch.object(task.WebsiteScraper, 'scrape_all', AsyncMock()), \
+         patch.object(task, 'QuestionGenerator') as generator:
+        with pytest.raises(task.ProcessingError):
+            await task.refresh_website("https://site.com/", redis_client)
+    
+    generator.assert_not_called()
+    mocks['delete_questions_for_website'].assert_not_called()
+    mocks['bulk_create_questions_for_website'].assert_not_called()
+    mocks['save_pages'].assert_not_called()
+    mocks['touch_website'].assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_prioritises_hot_urls():
+    """
+    Test warming refreshes uncached hot URLs first, then stale ones, within the batch
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    await redis_client.zadd(popularity.POPULARITY_KEY, {"https://hot.com/": 10, "https://warm.com/": 5, "https://stale-b.com/": 2})
+    await cache.QUESTIONS.async_set(redis_client, "https://warm.com/", [])
+    stale_sites = [MagicMock(url="https://stale-a.com/"), MagicMock(url="https://stale-b.com/")]
+    refreshed = []
+    
+    async def fake_refresh(url, _redis_client):
+        refreshed.append(url)
+        return url == "https://hot.com/"
+    
+    async def fake_stale(db, scraped_before, limit, urls=None):
+        return [site for site in stale_sites if urls is None or site.url in urls]
+    
+    async def fake_tracked(db, urls):
+        return set(urls)
+    
+    with patch.object(task, 'get_stale_websites', side_effect=fake_stale), \
+         patch.object(task, 'get_tracked_urls', side_effect=fake_tracked), \
+         patch.object(task, 'refresh_website', side_effect=fake_refresh), \
+         patch.object(task, 'delete_orphaned_page_contents', AsyncMock(return_value=0)) as prune:
+        counts = await task.warm_cache(redis_client, batch_size=2, concurrency=1)
+    
+    # The cached hot URL is left alone and the busier stale site goes first
+    assert refreshed == ["https://hot.com/", "https://stale-b.com/"]
+    assert counts == {'refreshed': 1, 'unchanged': 1, 'skipped': 0, 'failed': 0}
+    prune.assert_awaited_once()
+    # Request counts decay after every run
+    assert await redis_client.zscore(popularity.POPULARITY_KEY, "https://hot.com/") == 5
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_backs_off_failing_sites():
+    """
+    Test sites that fail to refresh and untracked hot URLs don't take the batch from the other stale sites
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    await redis_client.zadd(popularity.POPULARITY_KEY, {"https://gone.com/": 10, "https://dead-a.com/": 5})
+    oldest_first = ["https://dead-a.com/", "https://dead-b.com/", "https://ok.com/"]
+    touched, refreshed = [], []
+    
+    async def fake_stale(db, scraped_before, limit, urls=None):
+        stale = [url for url in oldest_first if url not in touched and (urls is None or url in urls)]
+        return [MagicMock(url=url) for url in stale[:limit]]
+    
+    async def fake_refresh(url, _redis_client):
+        refreshed.append(url)
+        if url.startswith("https://dead"):
+            raise task.ProcessingError(f"Nothing scraped from {url}")
+        return True
+    
+    async def fake_tracked(db, urls):
+        return set(urls) & set(oldest_first)
+    
+    with patch.object(task, 'get_stale_websites', side_effect=fake_stale), \
+         patch.object(task, 'get_tracked_urls', side_effect=fake_tracked), \
+         patch.object(task, 'get_website_id', AsyncMock(side_effect=lambda db, url: oldest_first.index(url))), \
+         patch.object(task, 'touch_website', AsyncMock(side_effect=lambda db, website_id: touched.append(oldest_first[website_id]))), \
+         patch.object(task, 'refresh_website', side_effect=fake_refresh), \
+         patch.object(task, 'delete_orphaned_page_contents', AsyncMock(return_value=0)):
+        first = await task.warm_cache(redis_client, batch_size=2, concurrency=1)
+        second = await task.warm_cache(redis_client, batch_size=2, concurrency=1)
+    
+    assert refreshed == ["https://dead-a.com/", "https://dead-b.com/", "https://ok.com/"]
+    assert (first['failed'], second['refreshed']) == (2, 1)
+    assert await redis_client.ttl(task.warm_backoff_key("https://dead-a.com/")) > 0
+
+
+@pytest.mark.asyncio
+async def test_regenerate_uses_stored_texts(tracked_website):
+    """
+    Test questions are regenerated from the stored page texts without scraping
+    """
+    _, mocks = tracked_website
+    redis_client = fakeredis.FakeAsyncRedis()
+    texts = {"https://site.com/": "Main text", "https://site.com/about": "About text"}
+    questions = [{'question': 'Q?', 'options': ['A', 'B']}]
+    generator = MagicMock()
+    generator.async_generate_questions = AsyncMock(return_value=questions)
+    with patch.object(task, 'get_page_texts', AsyncMock(return_value=texts)), \
+         patch.object(task.WebsiteScraper, 'scrape_all', AsyncMock()) as scrape_all, \
+         patch.object(task, 'QuestionGenerator', return_value=generator) as generator_class:
+        count = await task.regenerate_website("https://site.com/", redis_client)
+    
+    assert count == 1
+    scrape_all.assert_not_called()
+    url_info = generator_class.call_args.args[0]
+    assert url_info['main_page_text'] == "Main text"
+    assert url_info['link_texts'] == {"https://site.com/about": "About text"}
+    mocks['bulk_create_questions_for_website'].assert_awaited_once()
+    assert await task.get_cached_questions(redis_client, "https://site.com/") == questions
+
+
+@pytest.mark.asyncio
+async def test_generated_questions_are_published_one_by_one():
+    """
+    Test each question is published to the session as soon as the LLM streams it
+    """
+    from src.utils.streams import events_key
+    
+    redis_client = fakeredis.FakeAsyncRedis()
+    questions = [{'question': f'Q{i}?', 'options': ['A', 'B']} for i in range(4)]
+    published_before_done = []
+    
+    async def generate(on_question=None):
+        for question in questions:
+            await on_question(question)
+            published_before_done.append(await redis_client.xlen(events_key("session")))
+        return questions
+    
+    generator = MagicMock(url_info={'url': "https://site.com/", 'main_page_text': "Text", 'link_texts': {}})
+    generator.async_generate_questions = generate
+    with patch.object(task, 'get_questions_from_url', AsyncMock(return_value=None)), \
+         patch.object(task, 'create_website_with_questions', AsyncMock(return_value=1)):
+        await task.process_main_page("session", redis_client, generator)
+    
+    assert published_before_done == [1, 2, 3, 4]
+    events = await redis_client.xrange(events_key("session"))
+    assert [json.loads(fields[b'data'])['questions'] for _, fields in events] == [[q] for q in questions]
+
+
+@pytest.mark.asyncio
+async def test_lost_race_publishes_no_tail_of_the_stored_set():
+    """
+    Test a session that streamed its questions gets nothing from the set another worker stored first
+    """
+    from src.utils.streams import events_key
+    
+    redis_client = fakeredis.FakeAsyncRedis()
+    questions = [{'question': f'Q{i}?', 'options': ['A', 'B']} for i in range(2)]
+    stored = [{'question': f'Stored {i}?', 'options': ['A', 'B']} for i in range(5)]
+    
+    async def generate(on_question=None):
+        for question in questions:
+            await on_question(question)
+        return questions
+    
+    generator = MagicMock(url_info={'url': "https://site.com/", 'main_page_text': "Text", 'link_texts': {}})
+    generator.async_generate_questions = generate
+    with patch.object(task, 'get_questions_from_url', AsyncMock(side_effect=[None, None, stored])), \
+         patch.object(task, 'format_question_for_api', side_effect=lambda rows: rows), \
+         patch.object(task, 'create_website_with_questions', AsyncMock(return_value=None)):
+        await task.process_main_page("session", redis_client, generator)
+    
+    events = await redis_client.xrange(events_key("session"))
+    assert [json.loads(fields[b'data'])['questions'] for _, fields in events] == [[q] for q in questions]
+    assert await task.get_cached_questions(redis_client, "https://site.com/") == stored
+
+
+@pytest.mark.asyncio
+async def test_generation_without_main_text_fails():
+    """
+    Test a payload without main page text is scraped in the worker, and fails without generating when that scrape fails too
+    """
+    redis_client = fakeredis.FakeAsyncRedis()
+    generator = MagicMock(url_info={'url': "https://site.com/", 'main_page_text': "", 'link_texts': {}})
+    generator.async_generate_questions = AsyncMock()
+    with patch.object(task, 'get_questions_from_url', AsyncMock(return_value=None)), \
+         patch.object(task, 'create_website_with_questions', AsyncMock()) as create, \
+         patch.object(task.WebsiteScraper, 'scrape_all', AsyncMock()) as scrape_all:
+        with pytest.raises(task.ProcessingError):
+            await task.generate_questions_once(MagicMock(), "session", redis_client, generator)
+    
+    scrape_all.assert_awaited_once()
+    generator.async_generate_questions.assert_not_called()
+    create.assert_not_called()
+    assert not await redis_client.exists(task.questions_lock_key("https://site.com/"))
+
+
+@pytest.mark.asyncio
+async def test_worker_reports_pool_stats_while_running():
+    """
+    Test a worker process publishes its database pool stats periodically for the monitoring endpoint
+    """
+    import asyncio
+    
+    server = fakeredis.FakeServer()
+    stats = {'checkouts': 3, 'wait_avg': 0.01, 'wait_max': 0.02, 'size': 5, 'checked_out': 1, 'overflow': 0}
+    with patch.object(task, 'pool_stats', return_value=stats):
+        reporter = asyncio.create_task(task.report_pool_stats(fakeredis.FakeAsyncRedis(server=server), interval=0.01))
+        await asyncio.sleep(0.05)
+        reporter.cancel()
+    
+    reports = task.worker_pool_stats(fakeredis.FakeRedis(server=server))
+    assert list(reports.values()) == [stats]
+    assert list(reports)[0].endswith(f":{task.os.getpid()}")
@@ -0,0 +1,61 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+from kombu.serialization import dumps
+
+from src.utils import task_payload
+
+
+def make_scraper(main_text: str, link_texts: dict):
+    """
+    Scraped WebsiteScraper stand-in
+    """
+    url = "https://site.com/"
+    return MagicMock(
+        url=url,
+        home_page_text=main_text,
+        links=list(link_texts) + list(link_texts),
+        link_texts=link_texts,
+        pages={url: {'etag': '"1"', 'last_modified': None, 'content_hash': 'abc'}},
+    )
+
+
+@pytest.mark.asyncio
+async def test_payload_round_trip_parks_long_texts():
+    """
+    Test long page texts go to Redis by reference and come back on load
+    """
+    server = fakeredis.FakeServer()
+    long_text = "Long page text. " * 500
+    scraper = make_scraper(long_text, {"https://site.com/about": "Short text"})
+    
+    payload = task_payload.dump(fakeredis.FakeRedis(server=server), scraper)
+    
+    assert payload['texts'] == {"https://site.com/about": "Short text"}
+    assert list(payload['refs']) == ["https://site.com/"]
+    assert payload['links'] == ["https://site.com/about"]
+    assert len(dumps(payload, serializer='msgpack')[2]) < len(long_text) // 10
+    
+    scraped_info = await task_payload.load(fakeredis.FakeAsyncRedis(server=server), payload)
+    assert scraped_info['main_page_text'] == long_text
+    assert scraped_info['link_texts'] == {"https://site.com/about": "Short text"}
+    assert scraped_info['pages'] == scraper.pages
+
+
+@pytest.mark.asyncio
+async def test_load_rejects_bad_payloads():
+    """
+    Test payloads from another version, malformed ones and ones with expired texts are rejected
+    """
+    redis_client = fakeredis.FakeRedis()
+    with patch.object(task_payload, 'INLINE_TEXT_BYTES', 0):
+        payload = task_payload.dump(redis_client, make_scraper("Main text", {}))
+    
+    with pytest.raises(task_payload.PayloadError, match="version"):
+        await task_payload.load(fakeredis.FakeAsyncRedis(), {**payload, 'v': 0})
+    with pytest.raises(task_payload.PayloadError, match="links"):
+        await task_payload.load(fakeredis.FakeAsyncRedis(), {**payload, 'links': 'https://site.com/'})
+    # Texts parked in another Redis are missing here
+    with pytest.raises(task_payload.PayloadError, match="expired"):
+        await task_payload.load(fakeredis.FakeAsyncRedis(), payload)
@@ -3,38 +3,8 @@ import pytest
 import boto3
 from unittest.mock import patch, MagicMock
 from botocore.exceptions import NoCredentialsError
-from src.utils.utils import upload_to_s3, capture_screenshot
-
-@pytest.mark.asyncio
-async def test_upload_to_s3():
-    """
-    Test S3 upload utility function
-    """
-    # Create a temporary file for testing
-    test_file_path = "/tmp/test_upload.png"
-    with open(test_file_path, 'wb') as f:
-        f.write(b"test content")
-    
-    bucket_name = "test-bucket"
-    object_name = "test-object"
-    
-    with patch('boto3.client') as mock_boto_client, \
-         patch('os.remove') as mock_remove:
-        # Mock S3 client
-        mock_s3_client = MagicMock()
-        mock_boto_client.return_value = mock_s3_client
-        
-        # Set up environment variables
-        os.environ['AWS_ACCESS'] = 'test-access-key'
-        os.environ['AWS_SECRET'] = 'test-secret-key'
-        
-        # Call the function
-        result = upload_to_s3(test_file_path, bucket_name, object_name)
-        
-        # Assertions
-        mock_s3_client.upload_file.assert_called_once()
-        mock_remove.assert_called_once_with(test_file_path)
-        assert result == f"https://{bucket_name}.s3.amazonaws.com/{object_name}"
+from src.utils.utils import capture_screenshot_bytes, encode_image
+from src.utils.storage import LocalStorage, MemoryStorage, S3Storage, get_s3_client, get_storage
 
 @pytest.mark.asyncio
 async def test_capture_screenshot():
@@ -42,38 +12,154 @@ async def test_capture_screenshot():
     Test screenshot capture utility function
     Note: Requires Playwright to be installed
     """
-    from playwright.async_api import async_playwright
-    
     test_url = "https://www.apple.com"
     
-    async with async_playwright() as p:
-        screenshot_path = await capture_screenshot(test_url)
-        
-        # Verify screenshot was created
-        assert os.path.exists(screenshot_path)
-        assert screenshot_path.endswith('.png')
-        
-        # Clean up
-        os.remove(screenshot_path)
+    screenshot = await capture_screenshot_bytes(test_url)
+    
+    # Captured in memory as a PNG
+    assert screenshot.startswith(b"\x89PNG\r\n\x1a\n")
 
 
-def test_upload_to_s3_no_credentials():
+def test_s3_storage_no_credentials():
     """
     Test S3 upload with missing credentials
     """
-    test_file_path = "/tmp/test_upload.png"
-    with open(test_file_path, 'wb') as f:
-        f.write(b"test content")
-    
-    # Unset credentials
-    with patch.dict(os.environ, {}, clear=True), \
-         patch('boto3.client') as mock_boto_client:
-        
-        mock_boto_client.side_effect = NoCredentialsError
-        
-        try:
-            result = upload_to_s3(test_file_path, "test-bucket", "test-object")
-        except NoCredentialsError:
-            result = None
-
-        assert result is None
\ No newline at end of file
+    client = MagicMock()
+    client.upload_fileobj.side_effect = NoCredentialsError
+    
+    assert S3Storage(bucket_name="test-bucket", client=client).save("test-object", b"test content", "image/png") is None
+
+
+def make_png(width: int, height: int) -> bytes:
+    """
+    Build an in-memory PNG like the ones Playwright returns
+    """
+    import io
+    from PIL import Image
+    
+    output = io.BytesIO()
+    Image.new('RGBA', (width, height), (40, 120, 200, 255)).save(output, format='PNG')
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("image_format,content_type", [
+    ("png", "image/png"),
+    ("webp", "image/webp"),
+    ("jpeg", "image/jpeg"),
+])
+def test_encode_image(image_format, content_type):
+    """
+    Test re-encoding and downscaling screenshots to a thumbnail
+    """
+    import io
+    from PIL import Image
+    
+    data, extension, result_type = encode_image(make_png(1280, 2000), image_format, max_width=320)
+    
+    assert extension == image_format
+    assert result_type == content_type
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format.lower() == image_format
+        assert image.size == (320, 500)
+
+
+def test_encode_image_passthrough():
+    """
+    Test PNGs that need no conversion are returned as-is
+    """
+    png = make_png(100, 100)
+    data, extension, _ = encode_image(png, "png", max_width=320)
+    
+    assert data is png
+    assert extension == "png"
+
+
+def test_storage_backends(tmp_path):
+    """
+    Test the local and in-memory storage backends
+    """
+    memory = MemoryStorage()
+    assert memory.save("a.webp", b"image", "image/webp") == "memory://a.webp"
+    assert memory.objects["a.webp"] == (b"image", "image/webp")
+    
+    local = LocalStorage(directory=str(tmp_path), base_url="http://cdn.test/previews/")
+    assert local.save("b.png", b"image", "image/png") == "http://cdn.test/previews/b.png"
+    assert (tmp_path / "b.png").read_bytes() == b"image"
+    
+    with pytest.raises(ValueError):
+        get_storage("ftp")
+
+
+@pytest.fixture
+def s3_bucket():
+    """
+    Local S3 stand-in with an empty bucket
+    """
+    from moto import mock_aws
+    
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='test-bucket')
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_async_upload(s3_bucket):
+    """
+    Test uploads run off the event loop against a moto S3 bucket
+    """
+    import asyncio
+    import threading
+    
+    storage = S3Storage(bucket_name='test-bucket', client=s3_bucket)
+    loop_thread = threading.get_ident()
+    upload_threads = []
+    save = storage.save
+    
+    def recording_save(*args):
+        upload_threads.append(threading.get_ident())
+        return save(*args)
+    
+    with patch.object(storage, 'save', side_effect=recording_save):
+        urls = await asyncio.gather(*[
+            storage.asave(f"image-{i}.webp", b"image-%d" % i, "image/webp") for i in range(4)
+        ])
+    
+    assert urls[0] == "https://test-bucket.s3.amazonaws.com/image-0.webp"
+    assert loop_thread not in upload_threads
+    stored = s3_bucket.get_object(Bucket='test-bucket', Key='image-3.webp')
+    assert stored['Body'].read() == b"image-3"
+    assert stored['ContentType'] == "image/webp"
+
+
+def test_s3_storage_multipart_upload(s3_bucket):
+    """
+    Test large images are sent as a multipart upload
+    """
+    from boto3.s3.transfer import TransferConfig
+    
+    mb = 1024 * 1024
+    storage = S3Storage(
+        bucket_name='test-bucket',
+        client=s3_bucket,
+        transfer_config=TransferConfig(multipart_threshold=5 * mb, multipart_chunksize=5 * mb)
+    )
+    data = os.urandom(11 * mb)
+    
+    storage.save("large.png", data, "image/png")
+    
+    stored = s3_bucket.get_object(Bucket='test-bucket', Key='large.png')
+    assert stored['Body'].read() == data
+    # Multipart uploads get an ETag of the form "<md5>-<number of parts>"
+    assert stored['ETag'].strip('"').endswith("-3")
+
+
+def test_s3_client_is_shared():
+    """
+    Test the S3 client is built once per process
+    """
+    get_s3_client.cache_clear()
+    with patch('boto3.client') as mock_boto_client:
+        assert S3Storage(bucket_name='a').client is S3Storage(bucket_name='b').client
+        mock_boto_client.assert_called_once()
+    get_s3_client.cache_clear()